@@ -0,0 +1,164 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a submission is refused by rate or concurrency limits
+    """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets held in a bounded LRU; the least recently seen
+    client is evicted first, which at worst hands it a fresh full bucket.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def acquire(self, key: str) -> Optional[float]:
+        """
+        Take one token for `key`; returns None when allowed, otherwise the
+        number of seconds until a token is available
+        """
+        if self.rate <= 0:
+            return None
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(self.burst), now]
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            tokens, updated = bucket
+            bucket[0] = min(float(self.burst), tokens + (now - updated) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return None
+        return (1 - bucket[0]) / self.rate
+
+
+class DuplicateWindow:
+    """
+    Remembers content hashes for `window` seconds, bounded to `max_entries`
+    """
+
+    def __init__(self, window: float, max_entries: int = 10000):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @staticmethod
+    def content_hash(email: str, subject: str, message: str) -> str:
+        digest = hashlib.sha256()
+        for part in (email.strip().lower(), subject.strip(), message.strip()):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (seen_at, _) = next(iter(self._entries.items()))
+            if now - seen_at < self.window:
+                break
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        if self.window <= 0:
+            return None
+        self._expire(time.monotonic())
+        entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def add(self, key: str, message_id: str):
+        if self.window <= 0:
+            return
+        self._entries[key] = (time.monotonic(), message_id)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+
+
+class AdmissionController:
+    """
+    Admission checks for contact submissions: a per-client token bucket, a
+    global cap on in-flight inserts and duplicate suppression by content hash.
+
+    Clients are keyed on the connection's client address. Behind a reverse
+    proxy that address is the proxy's unless uvicorn resolves X-Forwarded-For,
+    which it only does for peers listed in FORWARDED_ALLOW_IPS (serve.py
+    --forwarded-allow-ips); without it every visitor shares one bucket. The
+    rate limit is therefore off unless CONTACT_RATE_PER_MINUTE is set.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float = 0,
+        burst: int = 5,
+        max_inflight: int = 100,
+        dedup_window: float = 600,
+        max_clients: int = 10000,
+        max_hashes: int = 10000,
+    ):
+        self.limiter = TokenBucketLimiter(rate_per_minute / 60, burst, max_clients)
+        self.duplicates = DuplicateWindow(dedup_window, max_hashes)
+        self.max_inflight = max_inflight
+        self.inflight = 0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            rate_per_minute=float(os.environ.get("CONTACT_RATE_PER_MINUTE", "0")),
+            burst=int(os.environ.get("CONTACT_RATE_BURST", "5")),
+            max_inflight=int(os.environ.get("CONTACT_MAX_INFLIGHT", "100")),
+            dedup_window=float(os.environ.get("CONTACT_DEDUP_WINDOW_SECONDS", "600")),
+            max_clients=int(os.environ.get("ADMISSION_MAX_CLIENTS", "10000")),
+            max_hashes=int(os.environ.get("ADMISSION_MAX_HASHES", "10000")),
+        )
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.limiter.rate > 0
+
+    def client_key(self, request) -> str:
+        # Already the forwarded client address when the proxy is trusted;
+        # reading X-Forwarded-For here would let any client pick its own key
+        return request.client.host if request.client else "unknown"
+
+    def check_rate(self, client: str):
+        wait = self.limiter.acquire(client)
+        if wait is not None:
+            raise AdmissionRejected("rate", max(1, int(wait + 0.999)))
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold one of the global insert slots for the duration of the block
+        """
+        if self.max_inflight > 0 and self.inflight >= self.max_inflight:
+            raise AdmissionRejected("concurrency", 1)
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
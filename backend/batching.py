@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+ACK_ON_FLUSH = "flush"
+ACK_ON_ENQUEUE = "enqueue"
+
+DUPLICATE_KEY = 11000
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the write-behind queue cannot accept more submissions
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__("Contact write queue is full")
+        self.retry_after = retry_after
+
+
+class BatchWriter:
+    """
+    Write-behind queue that groups contact inserts into insert_many calls.
+
+    Documents are flushed when `max_batch_size` is reached or when the oldest
+    queued document has waited `max_delay` seconds, whichever happens first.
+
+    Inserts are unordered, so a failed flush can still have stored part of the
+    batch; only the documents that were not written are treated as failed. In
+    enqueue mode nobody is waiting to hear about a failure, so those documents
+    are retried up to `max_retries` times with a doubling delay. Anything still
+    failing after that is logged and lost: enqueue mode trades that risk for
+    not holding the request open until the write.
+    """
+
+    def __init__(
+        self,
+        insert_many: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+        max_batch_size: int = 100,
+        max_delay: float = 0.05,
+        max_queue_size: int = 10000,
+        ack_mode: str = ACK_ON_FLUSH,
+        retry_after: int = 1,
+        max_retries: int = 3,
+        retry_delay: float = 0.5,
+        on_flush: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None,
+    ):
+        if ack_mode not in (ACK_ON_FLUSH, ACK_ON_ENQUEUE):
+            raise ValueError(f"Unknown ack mode: {ack_mode}")
+        self.insert_many = insert_many
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_queue_size = max_queue_size
+        self.ack_mode = ack_mode
+        self.retry_after = retry_after
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_flush = on_flush
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @classmethod
+    def from_env(cls, insert_many, on_flush=None) -> "BatchWriter":
+        return cls(
+            insert_many,
+            max_batch_size=int(os.environ.get("CONTACT_BATCH_MAX_SIZE", "100")),
+            max_delay=int(os.environ.get("CONTACT_BATCH_MAX_DELAY_MS", "50")) / 1000,
+            max_queue_size=int(os.environ.get("CONTACT_BATCH_QUEUE_SIZE", "10000")),
+            ack_mode=os.environ.get("CONTACT_BATCH_ACK", ACK_ON_FLUSH),
+            retry_after=int(os.environ.get("CONTACT_BATCH_RETRY_AFTER", "1")),
+            max_retries=int(os.environ.get("CONTACT_BATCH_MAX_RETRIES", "3")),
+            retry_delay=int(os.environ.get("CONTACT_BATCH_RETRY_DELAY_MS", "500")) / 1000,
+            on_flush=on_flush,
+        )
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, document: Dict[str, Any]):
+        """
+        Queue a document for insertion.
+
+        In flush mode this waits until the batch containing the document has
+        been written; in enqueue mode it returns as soon as it is queued.
+        """
+        if self._queue is None or self._closing:
+            raise QueueFullError(self.retry_after)
+
+        future = None
+        if self.ack_mode == ACK_ON_FLUSH:
+            future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((document, future))
+        except asyncio.QueueFull:
+            raise QueueFullError(self.retry_after)
+
+        if future is not None:
+            await future
+
+    async def close(self):
+        """
+        Stop accepting submissions and flush everything still queued
+        """
+        if self._task is None:
+            return
+        self._closing = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+        # Drain anything that was queued ahead of the stop sentinel's wake-up
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.max_batch_size):
+            await self._flush(remaining[start:start + self.max_batch_size])
+
+    async def _flush(self, batch):
+        retries = self.max_retries if self.ack_mode == ACK_ON_ENQUEUE else 0
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            batch, error = await self._write(batch)
+            if not batch:
+                return
+        logger.error(f"Dropping {len(batch)} contact messages after {retries + 1} attempts: {str(error)}")
+
+    async def _write(self, batch):
+        """
+        Insert one batch and settle its futures.
+
+        Returns the items that were not stored and still worth retrying, with
+        the error that stopped them.
+        """
+        documents = [document for document, _ in batch]
+        failed = {}
+        error = None
+        try:
+            await self.insert_many(documents)
+        except BulkWriteError as e:
+            error = e
+            failed = {write_error["index"]: write_error for write_error in e.details.get("writeErrors", [])}
+        except Exception as e:
+            error = e
+            failed = dict.fromkeys(range(len(batch)))
+        if error is not None:
+            logger.error(f"Error flushing {len(failed)} of {len(documents)} contact messages: {str(error)}")
+
+        stored = []
+        retry = []
+        for index, (document, future) in enumerate(batch):
+            if index not in failed:
+                stored.append(document)
+                if future is not None and not future.done():
+                    future.set_result(None)
+                continue
+            if future is not None:
+                if not future.done():
+                    future.set_exception(error)
+            elif (failed[index] or {}).get("code") != DUPLICATE_KEY:
+                # A duplicate key will not go away by trying again
+                retry.append((document, future))
+
+        if stored and self.on_flush is not None:
+            try:
+                await self.on_flush(stored)
+            except Exception as e:
+                logger.error(f"Error in contact flush hook: {str(e)}")
+        return retry, error
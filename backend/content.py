@@ -0,0 +1,151 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses fall back to gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTENT_PATH = Path(__file__).parent / "portfolio_content.json"
+
+
+class Variant(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class ContentBody:
+    """
+    One immutable JSON document with its precompressed variants
+    """
+
+    def __init__(self, document):
+        raw = json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()[:32]
+        self.variants: Dict[str, Variant] = {"identity": Variant(raw, f'"{digest}"')}
+        self.variants["gzip"] = Variant(gzip.compress(raw, compresslevel=9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variants["br"] = Variant(brotli.compress(raw, quality=11), f'"{digest}-br"')
+        self.etags = {variant.etag for variant in self.variants.values()}
+
+    def choose(self, accept_encoding: str) -> str:
+        accepted = set()
+        for part in accept_encoding.split(","):
+            coding, _, params = part.partition(";")
+            quality = 1.0
+            name, _, value = params.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+            if quality > 0:
+                accepted.add(coding.strip().lower())
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+
+
+class PortfolioContent:
+    """
+    Portfolio content served from a JSON file, prebuilt at load time into
+    ETagged, precompressed bodies for the whole document and each section.
+
+    The file is polled for changes and hot swapped; requests always see one
+    complete generation of bodies.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CONTENT_PATH, max_age: int = 300, reload_interval: float = 2.0):
+        self.path = Path(path)
+        self.max_age = max_age
+        self.reload_interval = reload_interval
+        self._bodies: Dict[Optional[str], ContentBody] = {}
+        self._mtime = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "PortfolioContent":
+        return cls(
+            path=Path(os.environ.get("PORTFOLIO_CONTENT_PATH", DEFAULT_CONTENT_PATH)),
+            max_age=int(os.environ.get("PORTFOLIO_CACHE_MAX_AGE", "300")),
+            reload_interval=float(os.environ.get("PORTFOLIO_RELOAD_INTERVAL", "2")),
+        )
+
+    def load(self):
+        mtime = self.path.stat().st_mtime_ns
+        document = json.loads(self.path.read_text(encoding="utf-8"))
+        bodies = {None: ContentBody(document)}
+        for section, value in document.items():
+            bodies[section] = ContentBody(value)
+        self._bodies = bodies
+        self._mtime = mtime
+        logger.info(f"Loaded portfolio content from {self.path} ({len(bodies) - 1} sections)")
+
+    def start(self):
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f"Error loading portfolio content: {str(e)}")
+        if self.reload_interval > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                if self.path.stat().st_mtime_ns != self._mtime:
+                    self.load()
+            except Exception as e:
+                # Keep serving the last good generation until the file is fixed
+                logger.error(f"Error reloading portfolio content: {str(e)}")
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._bodies)
+
+    @property
+    def sections(self):
+        return [section for section in self._bodies if section is not None]
+
+    def response(self, section: Optional[str], request) -> Optional[Response]:
+        """
+        Build the response for `section` (None for the whole document), or
+        return None if the section does not exist
+        """
+        body = self._bodies.get(section)
+        if body is None:
+            return None
+
+        encoding = body.choose(request.headers.get("accept-encoding", ""))
+        variant = body.variants[encoding]
+        headers = {
+            "ETag": variant.etag,
+            "Cache-Control": f"public, max-age={self.max_age}",
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or tags & body.etags:
+                return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=variant.body, media_type="application/json", headers=headers)
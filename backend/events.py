@@ -0,0 +1,274 @@
+import asyncio
+import itertools
+import logging
+import os
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from pydantic_core import to_json
+
+from schema import MIGRATED, decode_message
+
+logger = logging.getLogger(__name__)
+
+SOURCE_LOCAL = "local"
+SOURCE_CHANGE_STREAM = "changestream"
+
+
+# Change stream events are numbered by cluster time, which every worker
+# sees the same; local events by a counter under a per-process boot id
+CLUSTER_EPOCH = "cluster"
+
+# Queued to a subscriber to end its stream
+OVERFLOW = "overflow"
+CLOSED = "closed"
+
+Position = Tuple[int, ...]
+
+
+def parse_event_id(value: str) -> Tuple[str, Position]:
+    """
+    Split an event id into its epoch and position; raises ValueError if it
+    is malformed
+    """
+    epoch, _, position = value.partition("-")
+    return epoch, tuple(int(part) for part in position.split("."))
+
+
+class Event:
+    __slots__ = ("id", "position", "type", "data")
+
+    def __init__(self, epoch: str, position: Position, event_type: str, data: Dict[str, Any]):
+        self.id = f"{epoch}-{'.'.join(map(str, position))}"
+        self.position = position
+        self.type = event_type
+        self.data = data
+
+    def encode(self) -> bytes:
+        return b"id: %s\nevent: %s\ndata: %s\n\n" % (self.id.encode(), self.type.encode(), to_json(self.data))
+
+
+class Subscriber:
+    def __init__(self, buffer_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.overflowed = False
+
+
+class EventBroker:
+    """
+    In-process pub/sub for message events with a replay buffer.
+
+    Every subscriber gets a bounded queue; one that falls a full buffer
+    behind is disconnected rather than slowing publishers down. Local event
+    ids carry a boot id, so a Last-Event-ID from another process (or from
+    before a restart) gets a `reset` instead of a wrong slice of events.
+
+    With the change stream source, events come from a MongoDB change stream
+    instead of local publishes, so every worker sees writes made by any of
+    them; their ids come from the cluster time, so Last-Event-ID resumes
+    against any worker. Listeners are called synchronously for every
+    published event.
+
+    close_streams() ends every open stream so shutdown does not wait on
+    them; clients reconnect with their Last-Event-ID.
+    """
+
+    def __init__(
+        self,
+        source: str = SOURCE_LOCAL,
+        buffer_size: int = 256,
+        replay_size: int = 1000,
+        heartbeat: float = 15.0,
+    ):
+        self.source = source
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        self.epoch = CLUSTER_EPOCH if source == SOURCE_CHANGE_STREAM else uuid.uuid4().hex[:12]
+        self._ids = itertools.count(1)
+        self._cluster_time: Optional[Position] = None
+        self._replay: deque = deque(maxlen=replay_size)
+        self._subscribers: Set[Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._closed = False
+        self.disconnected = 0
+
+    @classmethod
+    def from_env(cls) -> "EventBroker":
+        return cls(
+            source=os.environ.get("EVENTS_SOURCE", SOURCE_LOCAL),
+            buffer_size=int(os.environ.get("EVENTS_SUBSCRIBER_BUFFER", "256")),
+            replay_size=int(os.environ.get("EVENTS_REPLAY_SIZE", "1000")),
+            heartbeat=float(os.environ.get("EVENTS_HEARTBEAT_SECONDS", "15")),
+        )
+
+    @property
+    def local(self) -> bool:
+        return self.source == SOURCE_LOCAL
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def add_listener(self, listener: Callable[[str, Dict[str, Any]], None]):
+        self._listeners.append(listener)
+
+    def publish(self, event_type: str, data: Dict[str, Any], cluster_time: Optional[Position] = None):
+        for listener in self._listeners:
+            try:
+                listener(event_type, data)
+            except Exception as e:
+                logger.error(f"Error in event listener: {str(e)}")
+        if cluster_time is None:
+            position = (next(self._ids),)
+        else:
+            # Writes in one transaction share a cluster time
+            if cluster_time != self._cluster_time:
+                self._cluster_time = cluster_time
+                self._ids = itertools.count(0)
+            position = (*cluster_time, next(self._ids))
+        event = Event(self.epoch, position, event_type, data)
+        self._replay.append(event)
+        for subscriber in list(self._subscribers):
+            if subscriber.overflowed:
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.disconnected += 1
+                self._end(subscriber, OVERFLOW)
+
+    def close_streams(self):
+        """
+        End every open stream and refuse new ones until the next start()
+        """
+        self._closed = True
+        for subscriber in list(self._subscribers):
+            self._end(subscriber, CLOSED)
+
+    @staticmethod
+    def _end(subscriber: Subscriber, reason: str):
+        # Make room if needed; the consumer stops at the reason either way
+        if subscriber.queue.full():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(reason)
+
+    async def stream(self, last_event_id: Optional[Tuple[str, Position]] = None) -> AsyncIterator[bytes]:
+        """
+        Server-Sent Events byte stream, replaying buffered events newer than
+        `last_event_id` (as parse_event_id returns it) first
+        """
+        if self._closed:
+            return
+        subscriber = Subscriber(self.buffer_size)
+        self._subscribers.add(subscriber)
+        # Events published while replaying land in the queue as well
+        sent: Position = ()
+        try:
+            yield b"retry: 3000\n\n"
+            if last_event_id is not None:
+                if self._resumable(*last_event_id):
+                    sent = last_event_id[1]
+                else:
+                    # The client must refetch; carry on from the newest event
+                    sent = self._replay[-1].position if self._replay else ()
+                    yield b"event: reset\ndata: {}\n\n"
+                for event in list(self._replay):
+                    if event.position > sent:
+                        sent = event.position
+                        yield event.encode()
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if event == OVERFLOW:
+                    yield b"event: overflow\ndata: {}\n\n"
+                    return
+                if event == CLOSED:
+                    return
+                if event.position <= sent:
+                    continue
+                sent = event.position
+                yield event.encode()
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def _resumable(self, epoch: str, position: Position) -> bool:
+        """
+        Whether every event after `position` is still in the replay buffer
+        or yet to come
+        """
+        if epoch != self.epoch:
+            return False
+        if not self._replay:
+            # A fresh worker cannot tell what it missed before it started
+            return False
+        oldest = self._replay[0].position
+        if self.local:
+            return oldest[0] - 1 <= position[0] <= self._replay[-1].position[0]
+        # A cluster id newer than the newest event here is one this worker's
+        # stream has yet to deliver
+        return position >= oldest
+
+    def start(self, db):
+        self._closed = False
+        if self.source == SOURCE_CHANGE_STREAM:
+            self._task = asyncio.create_task(self._watch(db))
+
+    async def stop(self):
+        self.close_streams()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self, db):
+        pipeline = [{"$match": {
+            "operationType": {"$in": ["insert", "update", "replace"]},
+            # Copies written by `schema.py migrate` are not new messages
+            "$or": [{"operationType": "update"}, {f"fullDocument.{MIGRATED}": {"$ne": True}}],
+        }}]
+        resume_token = None
+        while True:
+            try:
+                async with db.contact_messages.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self._publish_change(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Change stream error, reconnecting: {str(e)}")
+                await asyncio.sleep(1)
+
+    def _publish_change(self, change):
+        document = change.get("fullDocument")
+        if not document:
+            return
+        document = decode_message(document)
+        cluster_time = (change["clusterTime"].time, change["clusterTime"].inc)
+        if change["operationType"] == "insert":
+            self.publish("message.created", message_event(document), cluster_time)
+        else:
+            updated = change.get("updateDescription", {}).get("updatedFields", {})
+            if "status" in updated or change["operationType"] == "replace":
+                self.publish(
+                    "message.status", {"id": document["id"], "status": document.get("status")}, cluster_time
+                )
+
+
+def message_event(document: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": document["id"],
+        "name": document["name"],
+        "email": document["email"],
+        "subject": document["subject"],
+        "timestamp": document["timestamp"],
+        "status": document.get("status", "new"),
+    }
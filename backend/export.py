@@ -0,0 +1,138 @@
+import csv
+import io
+from typing import Any, AsyncIterator, Dict, List
+
+from pydantic_core import to_json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for Parquet exports
+    pa = None
+    pq = None
+
+EXPORT_FIELDS = ["id", "name", "email", "subject", "message", "timestamp", "status"]
+
+# Submitted text starting with one of these is read as a formula by
+# spreadsheet apps; such CSV cells get a leading quote
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_available() -> bool:
+    return pq is not None
+
+
+async def _batches(cursor, batch_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    batch = []
+    async for document in cursor:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def export_ndjson(cursor, batch_size: int) -> AsyncIterator[bytes]:
+    async for batch in _batches(cursor, batch_size):
+        yield b"".join(to_json(document) + b"\n" for document in batch)
+
+
+def csv_cell(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def export_csv(cursor, batch_size: int) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    async for batch in _batches(cursor, batch_size):
+        for document in batch:
+            writer.writerow({
+                **{field: csv_cell(value) for field, value in document.items()},
+                "timestamp": document["timestamp"].isoformat() if document.get("timestamp") else "",
+            })
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _DrainableSink(io.RawIOBase):
+    """
+    Write-only file object whose buffered bytes can be taken out as they are
+    produced, while tell() keeps reporting the absolute offset that the
+    Parquet footer needs
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema():
+    return pa.schema([
+        ("id", pa.string()),
+        ("name", pa.string()),
+        ("email", pa.string()),
+        ("subject", pa.string()),
+        ("message", pa.string()),
+        ("timestamp", pa.timestamp("ms")),
+        ("status", pa.string()),
+    ])
+
+
+async def export_parquet(cursor, batch_size: int) -> AsyncIterator[bytes]:
+    """
+    Stream a Parquet file with one row group per batch, so at most one batch
+    is held in memory at a time
+    """
+    schema = _parquet_schema()
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for batch in _batches(cursor, batch_size):
+            table = pa.Table.from_pylist(
+                [{field: document.get(field) for field in EXPORT_FIELDS} for document in batch],
+                schema=schema
+            )
+            writer.write_table(table)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+EXPORTERS = {
+    "ndjson": export_ndjson,
+    "csv": export_csv,
+    "parquet": export_parquet,
+}
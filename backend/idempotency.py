@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+STATE_PENDING = "pending"
+STATE_DONE = "done"
+
+
+class IdempotencyError(Exception):
+    """
+    Raised when a request cannot be matched to or run under its key
+    """
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def fingerprint(payload: bytes) -> str:
+    return hashlib.sha256(payload).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Runs an operation at most once per Idempotency-Key.
+
+    Completed responses are stored in a TTL-indexed collection, fronted by a
+    bounded in-process LRU. Concurrent requests with the same key share one
+    in-flight operation inside a process; across processes a pending record
+    claims the key and other requests wait for it to complete. A failed
+    operation releases the key so the client can retry.
+
+    A claim is a lease: a pending record not completed within
+    `lease_seconds` (its holder crashed) is taken over by the next request
+    for the key. The lease must outlast the slowest operation, or a slow
+    one may run twice.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        wait_timeout: float = 10.0,
+        poll_interval: float = 0.1,
+        lease_seconds: float = 30.0,
+    ):
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease_seconds)
+        self._recent: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyStore":
+        return cls(
+            max_entries=int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000")),
+            wait_timeout=float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "10")),
+            lease_seconds=float(os.environ.get("IDEMPOTENCY_LEASE_SECONDS", "30")),
+        )
+
+    def _remember(self, key: str, request_hash: str, response: Dict[str, Any]):
+        self._recent[key] = (request_hash, response)
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
+
+    @staticmethod
+    def _check(request_hash: str, stored_hash: str):
+        if request_hash != stored_hash:
+            raise IdempotencyError(422, "Idempotency-Key was already used with a different request")
+
+    async def execute(
+        self,
+        db,
+        key: str,
+        request_hash: str,
+        operation: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        recent = self._recent.get(key)
+        if recent is not None:
+            self._check(request_hash, recent[0])
+            self._recent.move_to_end(key)
+            return recent[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._check(request_hash, inflight[0])
+            return await asyncio.shield(inflight[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (request_hash, future)
+        try:
+            response = await self._execute(db, key, request_hash, operation)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(response)
+            self._remember(key, request_hash, response)
+            return response
+        finally:
+            del self._inflight[key]
+
+    async def _execute(self, db, key, request_hash, operation) -> Dict[str, Any]:
+        collection = db[IDEMPOTENCY_COLLECTION]
+        lease = uuid.uuid4().hex
+        while True:
+            now = datetime.utcnow()
+            try:
+                await collection.insert_one({
+                    "_id": key,
+                    "request_hash": request_hash,
+                    "state": STATE_PENDING,
+                    "lease": lease,
+                    "pending_until": now + self.lease,
+                    "created_at": now,
+                })
+                break
+            except DuplicateKeyError:
+                claimed, response = await self._wait_for(collection, key, request_hash, lease)
+                if claimed:
+                    break
+                if response is not None:
+                    return response
+
+        try:
+            response = await operation()
+        except BaseException:
+            await collection.delete_one({"_id": key, "state": STATE_PENDING, "lease": lease})
+            raise
+
+        try:
+            await collection.update_one(
+                {"_id": key},
+                {
+                    "$set": {"state": STATE_DONE, "response": response, "created_at": datetime.utcnow()},
+                    "$unset": {"lease": "", "pending_until": ""},
+                }
+            )
+        except Exception as e:
+            # The operation happened; failing now would invite the retry this
+            # key exists to absorb. Retries here hit the in-process cache,
+            # elsewhere they wait out the lease.
+            logger.error(f"Error storing response for idempotency key: {str(e)}")
+        return response
+
+    async def _wait_for(self, collection, key, request_hash, lease) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Another request holds the key; wait for its response. Returns
+        (True, None) if this request took over an expired claim, and
+        (False, None) if that attempt failed and released the key.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        while True:
+            record = await collection.find_one({"_id": key})
+            if record is None:
+                return False, None
+            self._check(request_hash, record["request_hash"])
+            if record["state"] == STATE_DONE:
+                return False, record["response"]
+            now = datetime.utcnow()
+            if record["pending_until"] <= now:
+                result = await collection.update_one(
+                    {"_id": key, "state": STATE_PENDING, "lease": record["lease"]},
+                    {"$set": {"lease": lease, "pending_until": now + self.lease}}
+                )
+                if result.modified_count:
+                    return True, None
+                continue
+            if loop.time() >= deadline:
+                raise IdempotencyError(409, "A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+from idempotency import IDEMPOTENCY_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Declarative index registry: collection name -> indexes that must exist.
+# Every index is named explicitly so it can be matched against the server.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "contact_messages": [
+        # Only documents in the legacy layout have a string id
+        IndexModel([("id", ASCENDING)], name="legacy_id", unique=True, sparse=True),
+        # Serves the timestamp range counts and the (timestamp, _id) keyset sort
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id_desc"),
+        IndexModel([("status", ASCENDING), ("timestamp", DESCENDING)], name="status_timestamp"),
+        # Backs /api/contact/search; subject and sender matches rank above body matches
+        IndexModel(
+            [("name", TEXT), ("email", TEXT), ("subject", TEXT), ("message", TEXT)],
+            name="message_text",
+            weights={"subject": 5, "name": 3, "email": 3, "message": 1},
+            default_language="english",
+        ),
+    ],
+    "contact_messages_archive": [
+        IndexModel([("id", ASCENDING)], name="legacy_id", unique=True, sparse=True),
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id_desc"),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS),
+    ],
+    "notification_outbox": [
+        IndexModel([("channel", ASCENDING), ("available_at", ASCENDING)], name="channel_available"),
+    ],
+    "notification_dead_letters": [
+        IndexModel([("channel", ASCENDING)], name="channel"),
+    ],
+    "message_rollups": [
+        IndexModel(
+            [("generation", ASCENDING), ("granularity", ASCENDING), ("start", ASCENDING)],
+            name="generation_granularity_start",
+        ),
+    ],
+}
+
+
+def _key(key) -> tuple:
+    return tuple((field, direction if isinstance(direction, str) else int(direction)) for field, direction in key.items())
+
+
+async def ensure_collection_indexes(db, collection: str) -> None:
+    """
+    Create the registered indexes of one collection.
+
+    An existing index on the same keys under another name is dropped first:
+    the server refuses to create the registered one next to it, and the one
+    older versions created on `id` (`id_unique`, unique but not sparse)
+    rejects every document without an `id`, which is every compact one.
+    """
+    models = INDEXES.get(collection)
+    if not models:
+        return
+    names = {model.document["name"] for model in models}
+    keys = {_key(model.document["key"]) for model in models}
+    async for index in db[collection].list_indexes():
+        if index["name"] not in names and _key(index["key"]) in keys:
+            await db[collection].drop_index(index["name"])
+            logger.warning(f"Dropped index {index['name']} on {collection}; a registered index replaces it")
+    await db[collection].create_indexes(models)
+
+
+async def ensure_indexes(db) -> None:
+    """
+    Create every registered index; existing identical indexes are left alone.
+    A collection that fails is logged and does not stop the others.
+    """
+    for collection, models in INDEXES.items():
+        if not models:
+            continue
+        try:
+            await ensure_collection_indexes(db, collection)
+            logger.info(f"Ensured {len(models)} indexes on {collection}")
+        except Exception as e:
+            logger.error(f"Error ensuring indexes on {collection}: {str(e)}")
+
+
+async def check_indexes(db) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare the registry with the server.
+
+    Returns, per collection, registered indexes that are missing, indexes that
+    exist but are not registered, and indexes with no recorded accesses in
+    $indexStats since the server last started.
+    """
+    report = {}
+    for collection, models in INDEXES.items():
+        expected = {model.document["name"] for model in models}
+        existing = set()
+        async for index in db[collection].list_indexes():
+            existing.add(index["name"])
+
+        unused = []
+        try:
+            async for stats in db[collection].aggregate([{"$indexStats": {}}]):
+                if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0:
+                    unused.append(stats["name"])
+        except Exception as e:
+            logger.warning(f"$indexStats unavailable for {collection}: {str(e)}")
+
+        report[collection] = {
+            "missing": sorted(expected - existing),
+            "unregistered": sorted(existing - expected - {"_id_"}),
+            "unused": sorted(unused),
+        }
+    return report
+
+
+def _connect():
+    from dotenv import load_dotenv
+
+    from storage import StorageConfig, open_storage
+
+    load_dotenv(Path(__file__).parent / '.env')
+    return open_storage(StorageConfig.from_env())
+
+
+if __name__ == "__main__":
+    import json
+    import typer
+
+    cli = typer.Typer(help="Manage MongoDB indexes for the portfolio API")
+
+    @cli.command()
+    def ensure():
+        """Create any missing registered indexes."""
+        async def run():
+            client, db = _connect()
+            try:
+                await ensure_indexes(db)
+            finally:
+                client.close()
+        asyncio.run(run())
+
+    @cli.command()
+    def check():
+        """Report missing, unregistered and unused indexes."""
+        async def run():
+            client, db = _connect()
+            try:
+                return await check_indexes(db)
+            finally:
+                client.close()
+        report = asyncio.run(run())
+        typer.echo(json.dumps(report, indent=2))
+        if any(entry["missing"] for entry in report.values()):
+            raise typer.Exit(code=1)
+
+    cli()
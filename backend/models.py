@@ -1,17 +1,40 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, model_validator
+from typing import Dict, List, Optional
+from enum import Enum
 import uuid
 from datetime import datetime
 
+class MessageStatus(str, Enum):
+    new = "new"
+    read = "read"
+    replied = "replied"
+    archived = "archived"
+    spam = "spam"
+
 class ContactMessage(BaseModel):
+    model_config = ConfigDict(use_enum_values=True, validate_default=True)
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     email: EmailStr
     subject: str
     message: str
     timestamp: datetime = Field(default_factory=datetime.utcnow)
-    status: str = "new"
+    status: MessageStatus = MessageStatus.new
     
+class ContactMessageSummary(BaseModel):
+    model_config = ConfigDict(use_enum_values=True)
+
+    id: str
+    name: str
+    email: EmailStr
+    subject: str
+    timestamp: datetime
+    status: MessageStatus
+
+class ContactMessageSearchResult(ContactMessage):
+    score: float
+
 class ContactMessageCreate(BaseModel):
     name: str
     email: EmailStr
@@ -21,4 +44,41 @@ class ContactMessageCreate(BaseModel):
 class ContactMessageResponse(BaseModel):
     success: bool
     message: str
-    id: Optional[str] = None
\ No newline at end of file
+    id: Optional[str] = None
+
+class MessageFilter(BaseModel):
+    status: Optional[MessageStatus] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    # An empty filter selects every message; that has to be asked for
+    all_messages: bool = False
+
+    @model_validator(mode="after")
+    def check_criteria(self):
+        empty = self.status is None and self.since is None and self.until is None
+        if empty and not self.all_messages:
+            raise ValueError("Provide 'status', 'since' or 'until', or set 'all_messages' to true")
+        if not empty and self.all_messages:
+            raise ValueError("'all_messages' cannot be combined with other criteria")
+        return self
+
+class BulkStatusUpdate(BaseModel):
+    status: MessageStatus
+    ids: Optional[List[str]] = Field(default=None, min_length=1, max_length=1000)
+    filter: Optional[MessageFilter] = None
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Provide exactly one of 'ids' or 'filter'")
+        return self
+
+class BulkStatusResult(BaseModel):
+    matched: bool
+    modified: bool
+
+class BulkStatusResponse(BaseModel):
+    success: bool
+    matched_count: int
+    modified_count: int
+    results: Optional[Dict[str, BulkStatusResult]] = None
@@ -0,0 +1,395 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import smtplib
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional
+
+from pydantic_core import to_json
+from pymongo import ReturnDocument
+
+from events import message_event
+from metrics import Counter, Gauge, Histogram, registry
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "notification_outbox"
+DEAD_LETTER_COLLECTION = "notification_dead_letters"
+
+CHANNEL_EMAIL = "email"
+CHANNEL_WEBHOOK = "webhook"
+
+DELIVERY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+notifications_total = registry.register(Counter(
+    "notifications_total", "Notification deliveries by channel and outcome", ("channel", "outcome")
+))
+notification_queue_depth = registry.register(Gauge(
+    "notification_queue_depth", "Notifications waiting in the outbox", ("channel",)
+))
+notification_dead_letters = registry.register(Gauge(
+    "notification_dead_letters", "Notifications that exhausted their retries", ("channel",)
+))
+notification_send_duration = registry.register(Histogram(
+    "notification_send_duration_seconds", "Time spent in one SMTP or webhook delivery", ("channel",)
+))
+notification_delivery_latency = registry.register(Histogram(
+    "notification_delivery_latency_seconds", "Time from enqueue to successful delivery", ("channel",),
+    buckets=DELIVERY_BUCKETS
+))
+
+
+class PermanentDeliveryError(Exception):
+    """
+    A notification that can never be delivered as it is; it is dead-lettered
+    without retries
+    """
+
+
+def header_value(value: str) -> str:
+    """
+    Fold user input onto one line; email headers may not contain CR or LF
+    """
+    return re.sub(r"[\r\n]+", " ", value).strip()
+
+
+class EmailChannel:
+    """
+    Sends notifications through an SMTP relay. smtplib blocks, so each send
+    runs in a worker thread.
+    """
+
+    name = CHANNEL_EMAIL
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        sender: str,
+        recipients: List[str],
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        timeout: float = 10.0,
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def compose(self, messages: List[Dict[str, Any]]) -> EmailMessage:
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = ", ".join(self.recipients)
+        if len(messages) == 1:
+            message = messages[0]
+            email["Subject"] = f"New contact message: {header_value(message['subject'])}"
+            email["Reply-To"] = message["email"]
+        else:
+            email["Subject"] = f"{len(messages)} new contact messages"
+        email.set_content("\n\n".join(
+            f"From: {message['name']} <{message['email']}>\n"
+            f"Subject: {message['subject']}\n"
+            f"Received: {message['timestamp']}\n"
+            f"Id: {message['id']}"
+            for message in messages
+        ))
+        return email
+
+    def _send(self, email: EmailMessage):
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(email)
+
+    async def send(self, messages: List[Dict[str, Any]]):
+        try:
+            email = self.compose(messages)
+        except (ValueError, TypeError) as e:
+            raise PermanentDeliveryError(f"Could not compose the email: {str(e)}") from e
+        await asyncio.to_thread(self._send, email)
+
+    async def close(self):
+        pass
+
+
+class WebhookChannel:
+    """
+    POSTs notifications as JSON to a webhook URL; any non-2xx response is a
+    failed delivery
+    """
+
+    name = CHANNEL_WEBHOOK
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        import httpx
+
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def send(self, messages: List[Dict[str, Any]]):
+        response = await self._client.post(
+            self.url,
+            content=to_json({"type": "contact.messages", "messages": messages}),
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class NotificationDispatcher:
+    """
+    Delivers new-message notifications from a persistent outbox.
+
+    The request path only inserts outbox documents; a pool of asyncio workers
+    claims them with a lease, delivers them and deletes them. A worker that
+    dies mid-delivery leaves its claim to expire, so delivery is at least
+    once. Failures are retried with exponential backoff and jitter, and
+    documents that fail `max_attempts` times, or with a
+    PermanentDeliveryError, move to the dead-letter collection.
+
+    Everything due on a channel at once, up to `digest_max`, goes out as a
+    single digest; a non-zero `digest_window` holds new messages back that
+    long so bursts are grouped.
+    """
+
+    def __init__(
+        self,
+        channels: Optional[List[Any]] = None,
+        workers: int = 2,
+        max_attempts: int = 8,
+        backoff_base: float = 2.0,
+        backoff_max: float = 3600.0,
+        digest_window: float = 0.0,
+        digest_max: int = 50,
+        poll_interval: float = 5.0,
+        lease: float = 60.0,
+    ):
+        self.channels = {channel.name: channel for channel in channels or []}
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.digest_window = digest_window
+        self.digest_max = digest_max
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self._db = None
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+
+    @classmethod
+    def from_env(cls) -> "NotificationDispatcher":
+        channels = []
+        smtp_host = os.environ.get("NOTIFY_SMTP_HOST")
+        recipients = os.environ.get("NOTIFY_EMAIL_TO", "")
+        if smtp_host and recipients:
+            channels.append(EmailChannel(
+                host=smtp_host,
+                port=int(os.environ.get("NOTIFY_SMTP_PORT", "25")),
+                sender=os.environ.get("NOTIFY_EMAIL_FROM", "portfolio@localhost"),
+                recipients=[address.strip() for address in recipients.split(",") if address.strip()],
+                username=os.environ.get("NOTIFY_SMTP_USER"),
+                password=os.environ.get("NOTIFY_SMTP_PASSWORD"),
+                starttls=os.environ.get("NOTIFY_SMTP_STARTTLS", "false").lower() == "true",
+            ))
+        webhook_url = os.environ.get("NOTIFY_WEBHOOK_URL")
+        if webhook_url:
+            channels.append(WebhookChannel(webhook_url))
+        return cls(
+            channels=channels,
+            workers=int(os.environ.get("NOTIFY_WORKERS", "2")),
+            max_attempts=int(os.environ.get("NOTIFY_MAX_ATTEMPTS", "8")),
+            backoff_base=float(os.environ.get("NOTIFY_BACKOFF_BASE_SECONDS", "2")),
+            backoff_max=float(os.environ.get("NOTIFY_BACKOFF_MAX_SECONDS", "3600")),
+            digest_window=float(os.environ.get("NOTIFY_DIGEST_WINDOW_SECONDS", "0")),
+            digest_max=int(os.environ.get("NOTIFY_DIGEST_MAX", "50")),
+            poll_interval=float(os.environ.get("NOTIFY_POLL_SECONDS", "5")),
+            lease=float(os.environ.get("NOTIFY_LEASE_SECONDS", "60")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.channels)
+
+    async def enqueue(self, db, documents: List[Dict[str, Any]]):
+        """
+        Add one outbox entry per message and channel
+        """
+        if not self.channels or not documents:
+            return
+        now = datetime.utcnow()
+        available_at = now + timedelta(seconds=self.digest_window)
+        await db[OUTBOX_COLLECTION].insert_many([
+            {
+                "_id": str(uuid.uuid4()),
+                "channel": channel,
+                "message": message_event(document),
+                "attempts": 0,
+                "created_at": now,
+                "available_at": available_at,
+            }
+            for document in documents
+            for channel in self.channels
+        ], ordered=False)
+        if self._wake is not None:
+            self._wake.set()
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def start(self, db):
+        self._db = db
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._monitor()))
+
+    async def stop(self):
+        """
+        Cancel the workers; anything they had claimed is redelivered once its
+        lease expires
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for channel in self.channels.values():
+            await channel.close()
+
+    async def _work(self):
+        while True:
+            delivered = 0
+            for channel in self.channels:
+                try:
+                    delivered += await self.deliver_due(self._db, channel)
+                except Exception as e:
+                    logger.error(f"Error delivering {channel} notifications: {str(e)}")
+            if delivered:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _monitor(self):
+        while True:
+            try:
+                await self.refresh_gauges(self._db)
+            except Exception as e:
+                logger.error(f"Error reading notification queue depth: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _claim(self, db, channel: str) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        claimed = []
+        while len(claimed) < self.digest_max:
+            document = await db[OUTBOX_COLLECTION].find_one_and_update(
+                {"channel": channel, "available_at": {"$lte": now}},
+                {"$set": {"available_at": now + timedelta(seconds=self.lease)}, "$inc": {"attempts": 1}},
+                sort=[("available_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if document is None:
+                break
+            claimed.append(document)
+        return claimed
+
+    async def deliver_due(self, db, channel: str) -> int:
+        """
+        Claim whatever is due on `channel` and send it as one notification or
+        digest; returns how many outbox entries were handled
+        """
+        documents = await self._claim(db, channel)
+        if not documents:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            await self.channels[channel].send([document["message"] for document in documents])
+        except Exception as e:
+            notification_send_duration.observe(time.perf_counter() - started, channel)
+            await self._failed(db, channel, documents, e)
+            return len(documents)
+        notification_send_duration.observe(time.perf_counter() - started, channel)
+
+        await db[OUTBOX_COLLECTION].delete_many({"_id": {"$in": [document["_id"] for document in documents]}})
+        now = datetime.utcnow()
+        for document in documents:
+            notification_delivery_latency.observe((now - document["created_at"]).total_seconds(), channel)
+        notifications_total.inc(channel, "delivered", amount=len(documents))
+        return len(documents)
+
+    async def _failed(self, db, channel: str, documents: List[Dict[str, Any]], error: Exception):
+        logger.warning(f"Delivering {len(documents)} {channel} notifications failed: {str(error)}")
+        now = datetime.utcnow()
+        dead = []
+        for document in documents:
+            if document["attempts"] >= self.max_attempts or isinstance(error, PermanentDeliveryError):
+                dead.append({**document, "last_error": str(error), "dead_at": now})
+                continue
+            await db[OUTBOX_COLLECTION].update_one(
+                {"_id": document["_id"]},
+                {"$set": {
+                    "available_at": now + timedelta(seconds=self.backoff(document["attempts"])),
+                    "last_error": str(error),
+                }}
+            )
+        notifications_total.inc(channel, "retried", amount=len(documents) - len(dead))
+
+        if dead:
+            # Insert before deleting so a crash in between only duplicates
+            await db[DEAD_LETTER_COLLECTION].insert_many(dead, ordered=False)
+            await db[OUTBOX_COLLECTION].delete_many({"_id": {"$in": [document["_id"] for document in dead]}})
+            notifications_total.inc(channel, "dead_lettered", amount=len(dead))
+            logger.error(f"Moved {len(dead)} {channel} notifications to the dead-letter queue")
+
+    async def refresh_gauges(self, db) -> Dict[str, Any]:
+        pending = {}
+        dead = {}
+        for channel in self.channels:
+            pending[channel] = await db[OUTBOX_COLLECTION].count_documents({"channel": channel})
+            dead[channel] = await db[DEAD_LETTER_COLLECTION].count_documents({"channel": channel})
+            notification_queue_depth.set(channel, value=pending[channel])
+            notification_dead_letters.set(channel, value=dead[channel])
+        return {"pending": pending, "dead_letters": dead}
+
+    async def status(self, db) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "channels": list(self.channels),
+            "workers": self.workers if self._tasks else 0,
+            **await self.refresh_gauges(db),
+        }
+
+    async def retry_dead_letters(self, db, channel: Optional[str] = None) -> int:
+        """
+        Move dead-lettered notifications back to the outbox with a fresh
+        retry budget
+        """
+        query = {"channel": channel} if channel else {}
+        now = datetime.utcnow()
+        moved = 0
+        async for document in db[DEAD_LETTER_COLLECTION].find(query):
+            document.pop("dead_at", None)
+            document.update({"attempts": 0, "available_at": now})
+            await db[OUTBOX_COLLECTION].replace_one({"_id": document["_id"]}, document, upsert=True)
+            await db[DEAD_LETTER_COLLECTION].delete_one({"_id": document["_id"]})
+            moved += 1
+        if moved and self._wake is not None:
+            self._wake.set()
+        return moved
@@ -0,0 +1,79 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple, Union
+
+from bson import Binary, ObjectId
+
+
+class InvalidCursorError(ValueError):
+    """
+    Raised when a pagination cursor cannot be decoded
+    """
+
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """
+    Build an opaque cursor pointing just past the stored `document` in
+    (timestamp, _id) order
+    """
+    raw_id = document["_id"]
+    if isinstance(raw_id, ObjectId):
+        # Legacy layout, until the compact schema migration has run
+        position = {"t": document["timestamp"].isoformat(), "o": str(raw_id)}
+    else:
+        position = {"t": document["timestamp"].isoformat(), "u": str(raw_id.as_uuid())}
+    payload = json.dumps(position, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Union[Binary, ObjectId]]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if "o" in payload:
+            raw_id = ObjectId(payload["o"])
+        else:
+            raw_id = Binary.from_uuid(uuid.UUID(payload["u"]))
+        return datetime.fromisoformat(payload["t"]), raw_id
+    except Exception as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+
+def build_message_query(
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Translate listing filters and an optional cursor into a Mongo query.
+
+    Results are ordered by (timestamp, _id) descending, so the cursor selects
+    documents strictly older than the last one returned, breaking timestamp
+    ties on _id.
+    """
+    query: Dict[str, Any] = {}
+    if status is not None:
+        query["status"] = status
+
+    time_range: Dict[str, Any] = {}
+    if since is not None:
+        time_range["$gte"] = since
+    if until is not None:
+        time_range["$lt"] = until
+    if time_range:
+        query["timestamp"] = time_range
+
+    if cursor is not None:
+        timestamp, raw_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": raw_id}},
+        ]
+        if isinstance(raw_id, ObjectId):
+            # Binary ids sort below ObjectIds but $lt only compares like types
+            query["$or"].append({"timestamp": timestamp, "_id": {"$type": "binData"}})
+
+    return query
@@ -0,0 +1,175 @@
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from models import ContactMessage, ContactMessageSummary
+from pagination import encode_cursor
+from retention import MESSAGE_COLLECTIONS, find_message
+from rollups import HOUR_FORMAT, hourly_group_pipeline
+from schema import decode_message, encode_message, id_query, ids_query
+from serialization import projection_for
+
+# Projections matching the listing response schemas; _id carries the
+# message id in the compact layout
+MESSAGE_PROJECTION = {**projection_for(ContactMessage), "_id": 1}
+SUMMARY_PROJECTION = {**projection_for(ContactMessageSummary), "_id": 1}
+SEARCH_PROJECTION = {**MESSAGE_PROJECTION, "score": {"$meta": "textScore"}}
+
+NEWEST_FIRST = [("timestamp", -1), ("_id", -1)]
+
+
+class ContactMessageRepository:
+    """
+    All contact message reads and writes made by the API handlers.
+
+    Takes and returns messages with their external string id; the storage
+    layout (see schema.py) is handled here. Works against any database handle
+    speaking the Motor collection API; engine-specific behaviour lives in
+    subclasses.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def collection(self):
+        return self.db.contact_messages
+
+    async def insert(self, document: Dict[str, Any]) -> bool:
+        result = await self.collection.insert_one(encode_message(document))
+        return result.inserted_id is not None
+
+    async def insert_many(self, documents: List[Dict[str, Any]]):
+        await self.collection.insert_many([encode_message(document) for document in documents], ordered=False)
+
+    async def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch one message, falling back to the archive tier
+        """
+        document = await find_message(self.db, id_query(message_id))
+        return decode_message(document) if document is not None else None
+
+    async def list(
+        self, query: Dict[str, Any], summary: bool, limit: int
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of messages and, when the page is full, the cursor for the next
+        """
+        projection = SUMMARY_PROJECTION if summary else MESSAGE_PROJECTION
+        documents = await self.collection.find(query, projection).sort(NEWEST_FIRST).limit(limit).to_list(limit)
+        next_cursor = encode_cursor(documents[-1]) if len(documents) == limit else None
+        return [decode_message(document) for document in documents], next_cursor
+
+    async def iterate(self, query: Dict[str, Any], batch_size: int):
+        """
+        Async iterator over matching messages, newest first, fetched in batches
+        """
+        cursor = self.collection.find(query, MESSAGE_PROJECTION).sort(NEWEST_FIRST).batch_size(batch_size)
+        async for document in cursor:
+            yield decode_message(document)
+
+    async def search(
+        self, text: str, status: Optional[str], limit: int, offset: int
+    ) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {"$text": {"$search": text}}
+        if status is not None:
+            query["status"] = status
+        documents = await self.collection.find(query, SEARCH_PROJECTION).sort(
+            [("score", {"$meta": "textScore"}), ("timestamp", -1)]
+        ).skip(offset).limit(limit).to_list(limit)
+        return [decode_message(document) for document in documents]
+
+    async def set_status(self, message_id: str, status: str) -> Optional[Dict[str, Any]]:
+        """
+        Change one message's status, in the hot collection or the archive;
+        returns its previous status and timestamp, or None if it does not
+        exist. Setting the status it already has writes nothing and returns
+        that status.
+        """
+        for collection in MESSAGE_COLLECTIONS:
+            previous = await self.db[collection].find_one_and_update(
+                id_query(message_id),
+                {"$set": {"status": status}},
+                projection={"status": 1, "timestamp": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+            if previous is not None:
+                return previous
+        return None
+
+    async def status_snapshot(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Current status and timestamp of each existing message in `ids`,
+        hot or archived
+        """
+        snapshot = {}
+        for collection in MESSAGE_COLLECTIONS:
+            async for document in self.db[collection].find(ids_query(ids), {"id": 1, "status": 1, "timestamp": 1}):
+                document = decode_message(document)
+                snapshot.setdefault(document["id"], document)
+        return snapshot
+
+    async def status_counts_by_hour(self, query: Dict[str, Any]) -> List[Tuple[datetime, str, int]]:
+        """
+        (hour, status, count) for the hot and archived messages matching `query`
+        """
+        return [
+            (datetime.strptime(row["_id"]["hour"], HOUR_FORMAT), row["_id"]["status"], row["count"])
+            for collection in MESSAGE_COLLECTIONS
+            async for row in self.db[collection].aggregate(hourly_group_pipeline(query))
+        ]
+
+    async def set_status_many(self, query: Dict[str, Any], status: str) -> int:
+        """
+        Change the status of every matching message in both tiers; returns
+        how many changed
+        """
+        modified = 0
+        for collection in MESSAGE_COLLECTIONS:
+            result = await self.db[collection].update_many(
+                {"$and": [query, {"status": {"$ne": status}}]},
+                {"$set": {"status": status}}
+            )
+            modified += result.modified_count
+        return modified
+
+
+class EmbeddedContactMessageRepository(ContactMessageRepository):
+    """
+    Repository for the embedded engine, which has no text indexes; search
+    scores matches in process with the same field weights as the Mongo index
+    """
+
+    SEARCH_WEIGHTS = {"subject": 5, "name": 3, "email": 3, "message": 1}
+
+    async def search(
+        self, text: str, status: Optional[str], limit: int, offset: int
+    ) -> List[Dict[str, Any]]:
+        terms = [term for term in re.findall(r"\w+", text.lower()) if term]
+        if not terms:
+            return []
+        pattern = "|".join(re.escape(term) for term in terms)
+        query: Dict[str, Any] = {"$or": [
+            {field: {"$regex": pattern, "$options": "i"}} for field in self.SEARCH_WEIGHTS
+        ]}
+        if status is not None:
+            query["status"] = status
+
+        results = []
+        async for document in self.collection.find(query, MESSAGE_PROJECTION):
+            score = 0.0
+            for field, weight in self.SEARCH_WEIGHTS.items():
+                words = re.findall(r"\w+", str(document.get(field, "")).lower())
+                if words:
+                    score += weight * sum(words.count(term) for term in terms) / len(words)
+            if score > 0:
+                results.append({**decode_message(document), "score": score})
+
+        results.sort(key=lambda document: (document["score"], document["timestamp"]), reverse=True)
+        return results[offset:offset + limit]
+
+
+def repository_for(db, embedded: bool) -> ContactMessageRepository:
+    return EmbeddedContactMessageRepository(db) if embedded else ContactMessageRepository(db)
@@ -0,0 +1,195 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+HOT_COLLECTION = "contact_messages"
+ARCHIVE_COLLECTION = "contact_messages_archive"
+MESSAGE_COLLECTIONS = (HOT_COLLECTION, ARCHIVE_COLLECTION)
+
+DUPLICATE_KEY = 11000
+
+
+def duplicate_id(error: Dict[str, Any]) -> Optional[bool]:
+    """
+    Whether a bulk write error is a duplicate _id, as opposed to a clash on
+    some other unique index; None when the error does not say which index
+    """
+    if error.get("code") != DUPLICATE_KEY:
+        return False
+    if "keyPattern" in error:
+        return list(error["keyPattern"]) == ["_id"]
+    # Older servers only name the index in the message; newer mongomock-motor
+    # versions append the key pattern, older ones and mongomock itself give a
+    # bare "E11000 Duplicate Key Error" for every index
+    message = error.get("errmsg", "")
+    if "index: " in message:
+        return "index: _id_ " in message
+    if "'keyPattern': " in message:
+        return "'keyPattern': {'_id': " in message
+    return None
+
+
+async def only_duplicate_ids(collection, errors: List[Dict[str, Any]], ids: List[Any]) -> bool:
+    """
+    Whether every error of a bulk write whose requests targeted `ids` (in
+    order) is a duplicate _id. An error that does not name its index counts
+    as one only if a document with that _id exists.
+    """
+    unnamed = set()
+    for error in errors:
+        classified = duplicate_id(error)
+        if classified is False:
+            return False
+        if classified is None:
+            unnamed.add(ids[error["index"]])
+    if not unnamed:
+        return True
+    return await collection.count_documents({"_id": {"$in": list(unnamed)}}) == len(unnamed)
+
+
+class RetentionPolicy:
+    """
+    Moves messages older than `max_age` whose status is in `statuses` from
+    the hot collection to the archive collection, in batches.
+
+    Each batch is copied before it is deleted, so an interrupted run leaves
+    at worst a copy in both tiers that the next run replaces. An original is
+    only deleted while it still has the status that was copied; messages
+    whose status changed between the copy and the delete stay hot and their
+    archive copy is removed.
+    """
+
+    def __init__(
+        self,
+        max_age: Optional[timedelta] = None,
+        statuses: Tuple[str, ...] = ("read", "replied", "archived", "spam"),
+        batch_size: int = 1000,
+        interval: float = 3600,
+        on_archived: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None,
+    ):
+        self.max_age = max_age
+        self.statuses = statuses
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_archived = on_archived
+
+    @classmethod
+    def from_env(cls, on_archived=None) -> "RetentionPolicy":
+        days = float(os.environ.get("RETENTION_MAX_AGE_DAYS", "0"))
+        statuses = os.environ.get("RETENTION_STATUSES", "read,replied,archived,spam")
+        return cls(
+            max_age=timedelta(days=days) if days > 0 else None,
+            statuses=tuple(status.strip() for status in statuses.split(",") if status.strip()),
+            batch_size=int(os.environ.get("RETENTION_BATCH_SIZE", "1000")),
+            interval=float(os.environ.get("RETENTION_INTERVAL_SECONDS", "3600")),
+            on_archived=on_archived,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age is not None
+
+    def selector(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        cutoff = (now or datetime.utcnow()) - self.max_age
+        return {"timestamp": {"$lt": cutoff}, "status": {"$in": list(self.statuses)}}
+
+    async def run(self, db, max_batches: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Archive every message matching the policy; returns how many moved
+        """
+        if not self.enabled:
+            return {"archived": 0, "batches": 0, "enabled": False}
+
+        selector = self.selector()
+        archived = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            documents = await db[HOT_COLLECTION].find(selector).limit(self.batch_size).to_list(self.batch_size)
+            if not documents:
+                break
+            archived += await self._move(db, documents)
+            batches += 1
+
+        if archived:
+            logger.info(f"Archived {archived} contact messages in {batches} batches")
+        return {"archived": archived, "batches": batches, "enabled": True}
+
+    async def _move(self, db, documents) -> int:
+        await self._copy(db, documents)
+
+        # Delete only originals still holding the status that was copied, as
+        # schema._convert_batch does; a status changed meanwhile may still
+        # match the policy, but the copy would not have the update
+        by_status: Dict[Any, List[Dict[str, Any]]] = {}
+        for document in documents:
+            by_status.setdefault(document.get("status"), []).append(document)
+        deleted: Dict[Any, int] = {}
+        for status, group in by_status.items():
+            result = await db[HOT_COLLECTION].delete_many(
+                {"_id": {"$in": [document["_id"] for document in group]}, "status": status}
+            )
+            deleted[status] = result.deleted_count
+
+        # Anything still hot changed meanwhile; drop its copy
+        ids = [document["_id"] for document in documents]
+        remaining = {
+            document["_id"]
+            async for document in db[HOT_COLLECTION].find({"_id": {"$in": ids}}, {"_id": 1})
+        }
+        if remaining:
+            await db[ARCHIVE_COLLECTION].delete_many({"_id": {"$in": list(remaining)}})
+
+        # Only what this run deleted counts as archived by it; a concurrent run
+        # that read the same batch deleted the rest. Which of a group were ours
+        # is not known, only how many, so the hook gets that many of them.
+        moved = []
+        for status, group in by_status.items():
+            gone = [document for document in group if document["_id"] not in remaining]
+            moved.extend(gone[:deleted[status]])
+        if moved and self.on_archived is not None:
+            await self.on_archived(moved)
+        return len(moved)
+
+    async def _copy(self, db, documents) -> None:
+        # Replacing overwrites a copy left by an interrupted run with the
+        # current version of the original
+        writes = [ReplaceOne({"_id": document["_id"]}, document, upsert=True) for document in documents]
+        try:
+            await db[ARCHIVE_COLLECTION].bulk_write(writes, ordered=False)
+        except BulkWriteError as e:
+            # A concurrent run upserting the same copy is harmless
+            ids = [document["_id"] for document in documents]
+            if not await only_duplicate_ids(db[ARCHIVE_COLLECTION], e.details["writeErrors"], ids):
+                raise
+
+
+async def ensure_archive_collection(db, compressed: bool = True) -> None:
+    """
+    Create the archive collection, with zstd block compression when the
+    engine supports it; it is written once and read rarely, so the extra CPU
+    on access is a good trade
+    """
+    options = {}
+    if compressed:
+        options["storageEngine"] = {"wiredTiger": {"configString": "block_compressor=zstd"}}
+    try:
+        await db.create_collection(ARCHIVE_COLLECTION, **options)
+    except CollectionInvalid:
+        pass
+
+
+async def find_message(db, query: Dict[str, Any], projection=None) -> Optional[Dict[str, Any]]:
+    """
+    Look a message up in the hot collection, then in the archive
+    """
+    for collection in MESSAGE_COLLECTIONS:
+        message = await db[collection].find_one(query, projection)
+        if message is not None:
+            return message
+    return None
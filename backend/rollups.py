@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import time
+import weakref
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from retention import MESSAGE_COLLECTIONS
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "message_rollups"
+META_ID = "meta"
+
+HOUR_FORMAT = "%Y-%m-%dT%H"
+DAY_FORMAT = "%Y-%m-%d"
+
+# A rebuild not swapped in after this long is presumed dead and may be
+# taken over
+REBUILD_TIMEOUT = timedelta(hours=1)
+
+# How long a worker keeps using its copy of the meta document before reading
+# it again. A rebuild's cutoff lies this far past its claim, so every worker
+# knows about the new generation before messages at the cutoff arrive.
+GENERATION_REFRESH = 1.0
+
+# db -> (monotonic time read, meta document)
+_meta_cache: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+# Widest range a single request may ask for, per bucket size
+MAX_BUCKETS = {"hour": 24 * 93, "day": 366 * 5, "week": 53 * 5}
+DEFAULT_SPAN = {"hour": timedelta(days=2), "day": timedelta(days=30), "week": timedelta(weeks=52)}
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """
+    Stored timestamps and rollup starts are naive UTC; bring request bounds
+    to the same form so they compare and key buckets consistently
+    """
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def truncate(timestamp: datetime, bucket: str) -> datetime:
+    if bucket == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def step(bucket: str) -> timedelta:
+    return {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}[bucket]
+
+
+def _rollup_ids(timestamp: datetime) -> Tuple[str, str]:
+    return f"hour:{timestamp.strftime(HOUR_FORMAT)}", f"day:{timestamp.strftime(DAY_FORMAT)}"
+
+
+def _rollup_update(generation: int, rollup_id: str, increments: Dict[str, int]) -> UpdateOne:
+    granularity, key = rollup_id.split(":", 1)
+    start = datetime.strptime(key, HOUR_FORMAT if granularity == "hour" else DAY_FORMAT)
+    return UpdateOne(
+        {"_id": f"{generation}:{rollup_id}"},
+        {
+            "$inc": increments,
+            "$setOnInsert": {"generation": generation, "granularity": granularity, "start": start},
+        },
+        upsert=True
+    )
+
+
+async def _meta(db, refresh: bool = False) -> Dict[str, Any]:
+    """
+    The meta document as this worker last read it, at most GENERATION_REFRESH
+    seconds ago
+    """
+    now = time.monotonic()
+    cached = _meta_cache.get(db)
+    if refresh or cached is None or now - cached[0] >= GENERATION_REFRESH:
+        meta = await db[ROLLUP_COLLECTION].find_one({"_id": META_ID}) or {}
+        _meta_cache[db] = (now, meta)
+        return meta
+    return cached[1]
+
+
+async def _apply(db, changes: Iterable[Tuple[datetime, Counter]]):
+    """
+    Add (message timestamp, counts) changes to the hour and day rollups of the
+    live generation and, for messages at or after its cutoff, of the
+    generation being built; the rebuild counts the older ones itself
+    """
+    meta = await _meta(db)
+    live, building = meta.get("generation"), meta.get("building")
+    increments: Dict[Tuple[int, str], Counter] = defaultdict(Counter)
+    for timestamp, counts in changes:
+        generations = [live] if live is not None else []
+        if building is not None and timestamp >= meta["building_cutoff"]:
+            generations.append(building)
+        for generation in generations:
+            for rollup_id in _rollup_ids(timestamp):
+                increments[generation, rollup_id].update(counts)
+    operations = [
+        _rollup_update(generation, rollup_id, {field: count for field, count in counts.items() if count})
+        for (generation, rollup_id), counts in increments.items() if any(counts.values())
+    ]
+    if operations:
+        await db[ROLLUP_COLLECTION].bulk_write(operations, ordered=False)
+
+
+async def record_inserts(db, documents: Iterable[Dict[str, Any]]) -> None:
+    """
+    Add stored messages to their hour and day rollups
+    """
+    await _apply(db, [
+        (document["timestamp"], Counter({"total": 1, f"statuses.{document.get('status', 'new')}": 1}))
+        for document in documents
+    ])
+
+
+async def record_status_moves(db, moves: Iterable[Tuple[datetime, str, int]], new_status: str) -> None:
+    """
+    Move status counts in the rollups of the affected messages; `moves`
+    holds (message timestamp, previous status, count) entries. Filter-based
+    bulk updates only know the hour of each message, which then stands in
+    for its timestamp.
+    """
+    await _apply(db, [
+        (timestamp, Counter({f"statuses.{old_status}": -count, f"statuses.{new_status}": count}))
+        for timestamp, old_status, count in moves if old_status != new_status and count
+    ])
+
+
+def hourly_group_pipeline(match: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Aggregation counting messages per (hour, status), used to rebuild the
+    rollups and to answer queries before they have been built
+    """
+    pipeline = [{"$match": match}] if match else []
+    pipeline.append({"$group": {
+        "_id": {
+            "hour": {"$dateToString": {"format": HOUR_FORMAT, "date": "$timestamp"}},
+            "status": "$status",
+        },
+        "count": {"$sum": 1},
+    }})
+    return pipeline
+
+
+async def _hourly_counts(db, match=None) -> Dict[datetime, Counter]:
+    counts: Dict[datetime, Counter] = defaultdict(Counter)
+    for collection in MESSAGE_COLLECTIONS:
+        async for row in db[collection].aggregate(hourly_group_pipeline(match)):
+            hour = datetime.strptime(row["_id"]["hour"], HOUR_FORMAT)
+            counts[hour][row["_id"]["status"]] += row["count"]
+    return counts
+
+
+async def _claim_build(db) -> Optional[Tuple[int, datetime]]:
+    """
+    Register a new generation as being built and return it with its cutoff,
+    or return None while another rebuild is in progress
+    """
+    now = datetime.utcnow()
+    meta = await db[ROLLUP_COLLECTION].find_one({"_id": META_ID}) or {}
+    building = meta.get("building")
+    if building is not None and meta["building_since"] > now - REBUILD_TIMEOUT:
+        return None
+    generation = max(meta.get("generation") or 0, building or 0) + 1
+    cutoff = now + timedelta(seconds=GENERATION_REFRESH)
+    try:
+        result = await db[ROLLUP_COLLECTION].update_one(
+            {"_id": META_ID, "building": building},
+            {"$set": {"building": generation, "building_since": now, "building_cutoff": cutoff}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return None
+    if not result.matched_count and result.upserted_id is None:
+        return None
+    return generation, cutoff
+
+
+async def rebuild_rollups(db) -> Dict[str, Any]:
+    """
+    Recompute every rollup from hot and archived messages into a new
+    generation and swap it in once complete.
+
+    Rollups are keyed by generation, and increments are no-ops until a first
+    generation is being built. A rebuild claims its generation with a cutoff
+    time: it counts the messages timestamped before the cutoff, and workers
+    send increments for messages at or after it to the new generation as
+    well as the live one, so each message is counted once. The rebuild waits
+    for the cutoff before it counts, by which time every worker has seen the
+    claim. A status change that races the count on an older message can
+    still be missed until the next rebuild. Readers keep seeing the previous
+    generation until the swap.
+    """
+    started = datetime.utcnow()
+    claimed = await _claim_build(db)
+    if claimed is None:
+        logger.info("Message rollups are already being rebuilt")
+        return {"rollups": 0, "in_progress": True}
+    generation, cutoff = claimed
+    await _meta(db, refresh=True)
+    await asyncio.sleep(max(0.0, (cutoff - datetime.utcnow()).total_seconds()))
+
+    hourly = await _hourly_counts(db, {"timestamp": {"$lt": cutoff}})
+    increments: Dict[str, Counter] = defaultdict(Counter)
+    for hour, statuses in hourly.items():
+        for rollup_id in _rollup_ids(hour):
+            increments[rollup_id]["total"] += sum(statuses.values())
+            for status, count in statuses.items():
+                increments[rollup_id][f"statuses.{status}"] += count
+    operations = [_rollup_update(generation, rollup_id, dict(counts)) for rollup_id, counts in increments.items()]
+    if operations:
+        await db[ROLLUP_COLLECTION].bulk_write(operations, ordered=False)
+
+    swapped = await db[ROLLUP_COLLECTION].update_one(
+        {"_id": META_ID, "building": generation},
+        {
+            "$set": {"generation": generation, "built_at": started},
+            "$unset": {"building": "", "building_since": "", "building_cutoff": ""},
+        }
+    )
+    await _meta(db, refresh=True)
+    if not swapped.matched_count:
+        # A stale-build takeover replaced this one; it cleans up after itself
+        logger.warning(f"Message rollup generation {generation} was superseded before the swap")
+        return {"rollups": 0, "superseded": True}
+
+    await db[ROLLUP_COLLECTION].delete_many({"generation": {"$lt": generation}})
+    logger.info(f"Rebuilt {len(increments)} message rollups as generation {generation}")
+    return {"rollups": len(increments), "generation": generation, "built_at": started}
+
+
+async def live_generation(db) -> Optional[int]:
+    """
+    The generation timeseries() reads, or None until rollups are built
+    """
+    meta = await db[ROLLUP_COLLECTION].find_one({"_id": META_ID}, {"generation": 1})
+    return meta.get("generation") if meta else None
+
+
+async def rollups_ready(db) -> bool:
+    return await live_generation(db) is not None
+
+
+async def timeseries(
+    db, bucket: str, start: datetime, end: datetime, by_status: bool = False
+) -> Dict[str, Any]:
+    """
+    Submission counts per bucket in [start, end), with empty buckets filled in.
+
+    Hour series read hourly rollups; day and week series read daily rollups.
+    Until the rollups have been built the counts come from an aggregation
+    over the message collections instead.
+    """
+    start = truncate(naive_utc(start), bucket)
+    end = naive_utc(end)
+    generation = await live_generation(db)
+    if generation is not None:
+        source = "rollups"
+        granularity = "hour" if bucket == "hour" else "day"
+        rows = db[ROLLUP_COLLECTION].find(
+            {"generation": generation, "granularity": granularity, "start": {"$gte": start, "$lt": end}},
+            {"_id": 0, "start": 1, "total": 1, "statuses": 1}
+        )
+        counts: Dict[datetime, Counter] = defaultdict(Counter)
+        async for row in rows:
+            counts[truncate(row["start"], bucket)].update(row.get("statuses", {}))
+    else:
+        source = "aggregation"
+        hourly = await _hourly_counts(db, {"timestamp": {"$gte": start, "$lt": end}})
+        counts = defaultdict(Counter)
+        for hour, statuses in hourly.items():
+            counts[truncate(hour, bucket)].update(statuses)
+
+    series = []
+    current = start
+    while current < end:
+        statuses = counts.get(current, Counter())
+        point = {"start": current, "total": sum(statuses.values())}
+        if by_status:
+            point["statuses"] = {status: count for status, count in statuses.items() if count}
+        series.append(point)
+        current += step(bucket)
+
+    return {"bucket": bucket, "from": start, "to": end, "source": source, "series": series}
@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import Binary, ObjectId
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from models import MessageStatus
+from indexes import ensure_collection_indexes
+from retention import MESSAGE_COLLECTIONS, only_duplicate_ids
+
+logger = logging.getLogger(__name__)
+
+# Compact message documents keep the message UUID as _id (BSON binary
+# subtype 4) and have no `id` field. Legacy documents carry the UUID as a
+# 36-char `id` string next to an ObjectId _id; they are read transparently
+# until `python schema.py migrate` has converted them.
+LEGACY_ID = "id"
+
+# Set on compact copies the migration writes, so change stream consumers can
+# tell them from new messages
+MIGRATED = "migrated"
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+MIGRATION_NAME = "compact_ids"
+
+# Indexes the compact layout replaced, dropped at the end of a migration pass
+OBSOLETE_INDEXES = ("id_unique", "timestamp_desc")
+
+STATUSES = {status.value for status in MessageStatus}
+
+COMPACT_VALIDATOR = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["_id", "name", "email", "subject", "message", "timestamp", "status"],
+        "properties": {
+            "_id": {"bsonType": "binData"},
+            "timestamp": {"bsonType": "date"},
+            "status": {"enum": sorted(STATUSES)},
+        },
+    }
+}
+
+
+def storage_id(message_id: str) -> Optional[Binary]:
+    """
+    The compact _id for an external message id, or None if it is not a UUID
+    """
+    try:
+        return Binary.from_uuid(uuid.UUID(message_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def encode_message(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    API-shaped message -> compact storage document
+    """
+    stored = {key: value for key, value in document.items() if key != LEGACY_ID}
+    stored["_id"] = Binary.from_uuid(uuid.UUID(document[LEGACY_ID]))
+    stored["status"] = MessageStatus(document.get("status", MessageStatus.new)).value
+    return stored
+
+
+def decode_message(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compact or legacy storage document -> API-shaped message with a string id
+    """
+    raw_id = document.pop("_id", None)
+    document.pop(MIGRATED, None)
+    if LEGACY_ID not in document and isinstance(raw_id, Binary):
+        return {LEGACY_ID: str(raw_id.as_uuid()), **document}
+    return document
+
+
+def id_query(message_id: str) -> Dict[str, Any]:
+    binary = storage_id(message_id)
+    if binary is None:
+        return {LEGACY_ID: message_id}
+    return {"$or": [{"_id": binary}, {LEGACY_ID: message_id}]}
+
+
+def ids_query(ids: List[str]) -> Dict[str, Any]:
+    binaries = [binary for binary in map(storage_id, ids) if binary is not None]
+    return {"$or": [{"_id": {"$in": binaries}}, {LEGACY_ID: {"$in": ids}}]}
+
+
+async def collection_sizes(db, collection: str) -> Optional[Dict[str, int]]:
+    try:
+        stats = await db.command({"collStats": collection})
+    except Exception as e:
+        logger.warning(f"collStats unavailable for {collection}: {str(e)}")
+        return None
+    return {
+        "count": stats.get("count", 0),
+        "size": stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "index_size": stats.get("totalIndexSize", 0),
+    }
+
+
+async def migrate_collection(
+    db, collection: str, batch_size: int = 500, max_batches: Optional[int] = None, pause: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Convert legacy documents in `collection` to the compact layout.
+
+    Runs online: each batch writes the compact copies, then deletes the
+    legacy originals whose copy is confirmed and whose status is still the
+    one that was copied. A legacy document updated in between keeps its
+    newer status and its stale copy is removed, to be converted on a later
+    pass. Progress is checkpointed in the schema_migrations collection, so
+    an interrupted run picks up where it stopped; documents whose id is not
+    a UUID or whose status is not a MessageStatus are left as they are and
+    counted as skipped. Copies are tagged with MIGRATED so the change
+    stream feed does not announce them as new messages.
+
+    The registered indexes are ensured before anything is written, which
+    replaces the legacy `id_unique` index that would reject compact copies.
+    """
+    await ensure_collection_indexes(db, collection)
+
+    state_id = f"{MIGRATION_NAME}:{collection}"
+    state = await db[MIGRATIONS_COLLECTION].find_one({"_id": state_id})
+    if state is None:
+        state = {
+            "_id": state_id,
+            "last_id": None,
+            "converted": 0,
+            "skipped": 0,
+            "started_at": datetime.utcnow(),
+            "before": await collection_sizes(db, collection),
+        }
+        await db[MIGRATIONS_COLLECTION].insert_one(state)
+
+    batches = 0
+    exhausted = False
+    while max_batches is None or batches < max_batches:
+        query: Dict[str, Any] = {LEGACY_ID: {"$exists": True}}
+        if state["last_id"] is not None:
+            query["_id"] = {"$gt": state["last_id"]}
+        documents = await db[collection].find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not documents:
+            exhausted = True
+            break
+
+        state["last_id"] = documents[-1]["_id"]
+        converted, skipped = await _convert_batch(db[collection], documents)
+        state["converted"] += converted
+        state["skipped"] += skipped
+        await db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": state_id},
+            {"$set": {
+                "last_id": state["last_id"],
+                "converted": state["converted"],
+                "skipped": state["skipped"],
+                "updated_at": datetime.utcnow(),
+            }}
+        )
+        batches += 1
+        if pause:
+            await asyncio.sleep(pause)
+
+    remaining = await db[collection].count_documents({LEGACY_ID: {"$exists": True}})
+    report = {
+        "converted": state["converted"],
+        "skipped": state["skipped"],
+        "remaining": remaining,
+        "before": state["before"],
+    }
+    if exhausted:
+        report.update(await _finish_collection(db, collection))
+        report["after"] = await collection_sizes(db, collection)
+        if report["before"] and report["after"]:
+            report["saved"] = {
+                key: report["before"][key] - report["after"][key]
+                for key in ("size", "storage_size", "index_size")
+            }
+        # A later run starts over, retrying documents whose status changed
+        # mid-batch and anything an old app version wrote meanwhile
+        await db[MIGRATIONS_COLLECTION].delete_one({"_id": state_id})
+    return report
+
+
+async def _convert_batch(collection, documents) -> Tuple[int, int]:
+    # (legacy _id, compact _id, status as stored in the legacy document)
+    pairs: List[Tuple[ObjectId, Binary, Any]] = []
+    writes = []
+    for document in documents:
+        legacy_id = document.pop("_id")
+        if storage_id(str(document[LEGACY_ID])) is None:
+            continue
+        if document.get("status", MessageStatus.new.value) not in STATUSES:
+            continue
+        compact = encode_message(document)
+        compact[MIGRATED] = True
+        pairs.append((legacy_id, compact["_id"], document.get("status")))
+        # Replacing overwrites a copy left by an interrupted run with the
+        # current version of the original
+        writes.append(ReplaceOne({"_id": compact["_id"]}, compact, upsert=True))
+    skipped = len(documents) - len(pairs)
+    if not pairs:
+        return 0, skipped
+
+    failure = None
+    try:
+        await collection.bulk_write(writes, ordered=False)
+    except BulkWriteError as e:
+        # A concurrent upsert of the same copy is harmless; anything else
+        # (another unique index) means some copies were not written
+        ids = [pair[1] for pair in pairs]
+        if not await only_duplicate_ids(collection, e.details["writeErrors"], ids):
+            failure = e
+
+    # Only originals whose copy is really there may go
+    confirmed = {
+        document["_id"]
+        async for document in collection.find({"_id": {"$in": [pair[1] for pair in pairs]}}, {"_id": 1})
+    }
+    by_status: Dict[Any, List[ObjectId]] = {}
+    for legacy_id, compact_id, status in pairs:
+        if compact_id in confirmed:
+            by_status.setdefault(status, []).append(legacy_id)
+
+    deleted = 0
+    for status, legacy_ids in by_status.items():
+        result = await collection.delete_many({"_id": {"$in": legacy_ids}, "status": status})
+        deleted += result.deleted_count
+
+    # Originals still present changed status meanwhile; drop their stale copies
+    if deleted < len(confirmed):
+        stale = [
+            storage_id(document[LEGACY_ID])
+            async for document in collection.find(
+                {"_id": {"$in": [pair[0] for pair in pairs]}}, {LEGACY_ID: 1}
+            )
+        ]
+        await collection.delete_many({"_id": {"$in": stale}})
+
+    if failure is not None:
+        raise failure
+    return deleted, skipped
+
+
+async def _finish_collection(db, collection: str) -> Dict[str, Any]:
+    """
+    Drop the indexes the compact layout made redundant and, once no legacy
+    documents are left, enforce the compact layout with a validator
+    """
+    existing = {index["name"] async for index in db[collection].list_indexes()}
+    dropped = []
+    for name in OBSOLETE_INDEXES:
+        if name in existing:
+            await db[collection].drop_index(name)
+            dropped.append(name)
+
+    validated = False
+    if await db[collection].count_documents({LEGACY_ID: {"$exists": True}}) == 0:
+        try:
+            await db.command({"collMod": collection, "validator": COMPACT_VALIDATOR, "validationLevel": "strict"})
+            validated = True
+        except Exception as e:
+            logger.warning(f"Could not add the schema validator to {collection}: {str(e)}")
+    return {"dropped_indexes": dropped, "validator": validated}
+
+
+async def migrate(
+    db, batch_size: int = 500, max_batches: Optional[int] = None, pause: float = 0.0
+) -> Dict[str, Any]:
+    return {
+        collection: await migrate_collection(
+            db, collection, batch_size=batch_size, max_batches=max_batches, pause=pause
+        )
+        for collection in MESSAGE_COLLECTIONS
+    }
+
+
+async def migration_status(db) -> Dict[str, Any]:
+    status = {}
+    for collection in MESSAGE_COLLECTIONS:
+        state = await db[MIGRATIONS_COLLECTION].find_one({"_id": f"{MIGRATION_NAME}:{collection}"})
+        status[collection] = {
+            "legacy": await db[collection].count_documents({LEGACY_ID: {"$exists": True}}),
+            "compact": await db[collection].count_documents({LEGACY_ID: {"$exists": False}}),
+            "in_progress": state is not None,
+            "converted": state["converted"] if state else 0,
+            "sizes": await collection_sizes(db, collection),
+        }
+    return status
+
+
+if __name__ == "__main__":
+    import json
+    from pathlib import Path
+
+    import typer
+    from dotenv import load_dotenv
+
+    from storage import StorageConfig, open_storage
+
+    load_dotenv(Path(__file__).parent / '.env')
+    cli = typer.Typer(help="Migrate contact messages to the compact storage schema")
+
+    def _run(operation):
+        async def run():
+            client, db = open_storage(StorageConfig.from_env())
+            try:
+                return await operation(db)
+            finally:
+                client.close()
+        return asyncio.run(run())
+
+    @cli.command("migrate")
+    def migrate_command(
+        batch_size: int = typer.Option(500, help="Documents converted per batch"),
+        max_batches: Optional[int] = typer.Option(None, help="Stop after this many batches per collection"),
+        pause: float = typer.Option(0.0, help="Seconds to sleep between batches"),
+    ):
+        """Convert legacy documents in batches; safe to interrupt and rerun."""
+        report = _run(lambda db: migrate(db, batch_size=batch_size, max_batches=max_batches, pause=pause))
+        typer.echo(json.dumps(report, indent=2, default=str))
+
+    @cli.command()
+    def status():
+        """Show how many legacy documents are left and the current sizes."""
+        typer.echo(json.dumps(_run(migration_status), indent=2, default=str))
+
+    cli()
@@ -0,0 +1,23 @@
+from typing import Any, Dict, Optional, Type
+
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+
+def projection_for(model: Type[BaseModel]) -> Dict[str, int]:
+    """
+    Mongo projection returning exactly the fields of `model` and no `_id`
+    """
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+
+def json_response(content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Encode trusted, already-shaped data straight to JSON bytes with
+    pydantic-core, skipping response_model validation and jsonable_encoder.
+
+    Only use this for rows read with `projection_for` so the output keeps the
+    declared response schema.
+    """
+    return Response(content=to_json(content), media_type="application/json", headers=headers)
@@ -0,0 +1,173 @@
+import importlib.util
+import math
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+import typer
+import uvicorn
+from dotenv import load_dotenv
+from uvicorn.supervisors import Multiprocess
+
+from storage import StorageConfig
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+cli = typer.Typer(help="Run the portfolio API")
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process may actually use: the scheduler affinity mask, capped
+    by a cgroup CPU quota. os.cpu_count() is the host's count, which in a
+    container can be far more than the quota.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    try:
+        # cgroup v2: "<quota> <period>", quota is "max" when unlimited
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+class Server(uvicorn.Server):
+    """
+    uvicorn waits for open responses to finish before it runs the app's
+    shutdown hook, so an event stream would hold the worker for the whole
+    graceful timeout. This ends the streams as soon as the exit signal
+    arrives.
+    """
+
+    def handle_exit(self, sig, frame):
+        super().handle_exit(sig, frame)
+        api = sys.modules.get("server")
+        if api is not None:
+            api.event_broker.close_streams()
+
+
+def pool_size_per_worker(budget: int, workers: int) -> int:
+    """
+    Split a deployment-wide Mongo connection budget across worker processes
+    """
+    return max(1, budget // workers)
+
+
+@cli.command()
+def run(
+    host: str = typer.Option(os.environ.get("HOST", "0.0.0.0"), help="Interface to bind"),
+    port: int = typer.Option(int(os.environ.get("PORT", "8001")), help="Port to bind"),
+    workers: int = typer.Option(
+        int(os.environ.get("WEB_CONCURRENCY", str(available_cpus()))), min=1,
+        help="Worker processes; defaults to the CPUs available to this container",
+    ),
+    pool_budget: int = typer.Option(
+        int(os.environ.get("MONGO_POOL_BUDGET", "100")), min=1,
+        help="Total Mongo connections across all workers",
+    ),
+    max_pool_size: Optional[int] = typer.Option(
+        None, min=1,
+        help="Mongo connections per worker; defaults to MONGO_MAX_POOL_SIZE if set, else a share of --pool-budget",
+    ),
+    graceful_timeout: int = typer.Option(
+        int(os.environ.get("GRACEFUL_TIMEOUT_SECONDS", "30")),
+        help="Seconds to let in-flight requests finish on shutdown",
+    ),
+    keep_alive: int = typer.Option(5, help="Seconds to hold idle keep-alive connections"),
+    backlog: int = typer.Option(2048, help="Listen socket backlog"),
+    limit_concurrency: Optional[int] = typer.Option(
+        None, help="Connections per worker before new ones get 503"
+    ),
+    forwarded_allow_ips: Optional[str] = typer.Option(
+        os.environ.get("FORWARDED_ALLOW_IPS"), help="Proxies trusted for X-Forwarded-* headers"
+    ),
+    log_level: str = typer.Option("info"),
+):
+    """Serve the API with multiple worker processes for production."""
+    storage = StorageConfig.from_env()
+    if storage.embedded and workers > 1:
+        typer.echo("The embedded storage engine keeps data per process; run it with --workers 1", err=True)
+        raise typer.Exit(code=1)
+    if workers > 1 and os.environ.get("EVENTS_SOURCE", "local") == "local":
+        typer.echo(
+            "Warning: with EVENTS_SOURCE=local each worker only streams its own events, and a "
+            "worker's read cache can serve a message's old status for up to CACHE_TTL_SECONDS "
+            "after another worker changed it; set EVENTS_SOURCE=changestream to share events "
+            "and cache invalidations, or CACHE_TTL_SECONDS=0 to disable the cache", err=True
+        )
+
+    # Workers are spawned from this process and inherit its environment
+    if max_pool_size is None and os.environ.get("MONGO_MAX_POOL_SIZE"):
+        pool_size = int(os.environ["MONGO_MAX_POOL_SIZE"])
+    else:
+        pool_size = max_pool_size or pool_size_per_worker(pool_budget, workers)
+    os.environ["MONGO_MAX_POOL_SIZE"] = str(pool_size)
+    if pool_size < 2 and os.environ.get("EVENTS_SOURCE") == "changestream":
+        typer.echo(
+            f"Warning: each worker gets maxPoolSize={pool_size} and its change stream holds a "
+            "connection; raise --pool-budget or lower --workers", err=True
+        )
+
+    loop = "uvloop" if _available("uvloop") else "asyncio"
+    http = "httptools" if _available("httptools") else "h11"
+    typer.echo(
+        f"Starting {workers} workers on {host}:{port} "
+        f"(loop={loop}, http={http}, maxPoolSize={pool_size} per worker)"
+    )
+    sys.path.insert(0, str(ROOT_DIR))
+    config = uvicorn.Config(
+        "server:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=backlog,
+        limit_concurrency=limit_concurrency,
+        timeout_keep_alive=keep_alive,
+        timeout_graceful_shutdown=graceful_timeout,
+        forwarded_allow_ips=forwarded_allow_ips,
+        proxy_headers=True,
+        log_level=log_level,
+    )
+    # What uvicorn.run() does, with the Server above
+    server = Server(config)
+    if workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+@cli.command()
+def dev(
+    host: str = typer.Option("0.0.0.0"),
+    port: int = typer.Option(8001),
+):
+    """Single process with auto-reload, for local development."""
+    uvicorn.run("server:app", app_dir=str(ROOT_DIR), host=host, port=port, reload=True)
+
+
+if __name__ == "__main__":
+    cli()
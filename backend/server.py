@@ -1,21 +1,127 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
-from models import ContactMessage, ContactMessageCreate, ContactMessageResponse
-from typing import List
+from models import (
+    BulkStatusResponse, BulkStatusResult, BulkStatusUpdate, ContactMessage, ContactMessageCreate,
+    ContactMessageResponse, ContactMessageSearchResult, ContactMessageSummary, MessageStatus
+)
+from cache import ReadCache
+from admission import AdmissionController, AdmissionRejected, DuplicateWindow
+from content import PortfolioContent
+from idempotency import IdempotencyError, IdempotencyStore, fingerprint
+from events import EventBroker, message_event, parse_event_id
+from export import EXPORTERS, MEDIA_TYPES, parquet_available
+from notifications import NotificationDispatcher
+from batching import BatchWriter, QueueFullError
+from metrics import MetricsMiddleware, MongoCommandMetrics, registry as metrics_registry
+from slowops import SlowOpTracer
+from indexes import check_indexes, ensure_indexes
+from serialization import json_response
+from storage import StorageConfig, open_storage
+from repository import repository_for
+from schema import ids_query
+import rollups
+from retention import RetentionPolicy, ensure_archive_collection
+from pagination import InvalidCursorError, build_message_query
+from stats import (
+    month_key, read_stats, reconcile_stats, record_archived, record_bulk_status_change,
+    record_inserts, record_status_change
+)
+from typing import List, Literal, Optional, Union
 from datetime import datetime
+from collections import Counter
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Storage configuration and connection, both set up in the startup hook so
+# the module imports without MONGO_URL
+storage_config = None
+client = None
+db = None
+messages_repo = None
+
+# Optional log of slow MongoDB commands with their route and query plan
+slow_op_tracer = None
+if os.environ.get('SLOW_OP_ENABLED', 'false').lower() == 'true':
+    slow_op_tracer = SlowOpTracer.from_env()
+
+# Live feed of message events for /api/contact/stream
+event_broker = EventBroker.from_env()
+
+# Owner notifications, delivered from an outbox by background workers
+notifier = NotificationDispatcher.from_env()
+
+# In-process read cache for message lookups, first listing pages and stats
+read_cache = ReadCache.from_env()
+
+def invalidate_listings():
+    read_cache.invalidate_where(lambda key: key[0] in ("messages", "stats"))
+
+def invalidate_from_event(event_type, data):
+    read_cache.invalidate(("message", data["id"]))
+    invalidate_listings()
+
+# With the change stream feed, writes made by other workers invalidate this
+# worker's cache too; local events come from writes this worker already
+# invalidated for
+if not event_broker.local:
+    event_broker.add_listener(invalidate_from_event)
+
+async def after_insert(documents):
+    """
+    Bookkeeping for messages once they are durably stored. The notification
+    outbox entry is written first, and every step runs even if an earlier
+    one fails
+    """
+    steps = (
+        ("queueing notifications", notifier.enqueue),
+        ("updating stats counters", record_inserts),
+        ("updating rollups", rollups.record_inserts),
+    )
+    for action, step in steps:
+        try:
+            await step(db, documents)
+        except Exception as e:
+            logging.error(f"Error {action}: {str(e)}")
+    invalidate_listings()
+    if event_broker.local:
+        for document in documents:
+            event_broker.publish("message.created", message_event(document))
+
+# Optional write-behind batching for contact submissions
+batch_writer = None
+if os.environ.get('CONTACT_BATCH_ENABLED', 'false').lower() == 'true':
+    batch_writer = BatchWriter.from_env(
+        lambda documents: messages_repo.insert_many(documents),
+        on_flush=after_insert
+    )
+
+# Idempotency-Key handling for POST /api/contact
+idempotency = IdempotencyStore.from_env()
+
+# Rate limiting, concurrency cap and duplicate suppression for submissions
+admission = AdmissionController.from_env()
+
+# Prebuilt, precompressed portfolio content
+portfolio_content = PortfolioContent.from_env()
+
+async def after_archive(documents):
+    await record_archived(db, len(documents))
+    invalidate_listings()
+
+# Age/status based archival of old messages to the archive collection
+retention_policy = RetentionPolicy.from_env(on_archived=after_archive)
+retention_task = None
+
+# Periodic stats reconciliation, disabled when the interval is 0
+STATS_RECONCILE_INTERVAL = int(os.environ.get('STATS_RECONCILE_INTERVAL', '0'))
+stats_reconcile_task = None
 
 # Create the main app without a prefix
 app = FastAPI(title="Prajwal H S Portfolio API", version="1.0.0")
@@ -23,56 +129,249 @@ app = FastAPI(title="Prajwal H S Portfolio API", version="1.0.0")
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Health check endpoint
+# Readiness probes wait at most this long for Mongo to answer a ping
+READY_TIMEOUT = float(os.environ.get('READY_TIMEOUT_SECONDS', '2'))
+
+# Health check endpoint; liveness only, it never touches the database
 @api_router.get("/")
 async def root():
     return {"message": "Prajwal H S Portfolio API is running", "status": "healthy"}
 
+# Readiness endpoint for load balancers and orchestrators
+@api_router.get("/ready")
+async def ready():
+    """
+    Report whether this worker can serve traffic: storage is open and Mongo
+    answers a ping within READY_TIMEOUT seconds
+    """
+    if db is None:
+        raise HTTPException(status_code=503, detail="Storage not initialised")
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_TIMEOUT)
+    except Exception as e:
+        logging.warning(f"Readiness check failed: {str(e)}")
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready", "storage": storage_config.engine}
+
 # Contact form endpoints
 @api_router.post("/contact", response_model=ContactMessageResponse)
-async def create_contact_message(contact_data: ContactMessageCreate):
+async def create_contact_message(contact_data: ContactMessageCreate, request: Request):
     """
-    Submit a contact form message
+    Submit a contact form message.
+
+    Retries carrying the same Idempotency-Key header get the original
+    response back without storing the message again.
     """
+    key = request.headers.get("idempotency-key")
+    if key is None:
+        return await save_contact_message(contact_data, request)
+    if not 1 <= len(key) <= 255:
+        raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
+
+    async def operation():
+        response = await save_contact_message(contact_data, request)
+        return response.model_dump()
+
     try:
-        # Create contact message object
-        contact_message = ContactMessage(**contact_data.dict())
-        
-        # Save to database
-        result = await db.contact_messages.insert_one(contact_message.dict())
-        
-        if result.inserted_id:
+        response = await idempotency.execute(
+            db, key, fingerprint(contact_data.model_dump_json().encode()), operation
+        )
+    except IdempotencyError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error applying idempotency key: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    return ContactMessageResponse(**response)
+
+async def save_contact_message(contact_data: ContactMessageCreate, request: Request) -> ContactMessageResponse:
+    content_key = None
+    try:
+        admission.check_rate(admission.client_key(request))
+
+        # Identical resubmissions within the window are acknowledged, not stored
+        content_key = DuplicateWindow.content_hash(
+            contact_data.email, contact_data.subject, contact_data.message
+        )
+        duplicate_id = admission.duplicates.get(content_key)
+        if duplicate_id is not None:
+            content_key = None
             return ContactMessageResponse(
                 success=True,
                 message="Thank you for your message! I'll get back to you soon.",
-                id=contact_message.id
+                id=duplicate_id
             )
-        else:
-            raise HTTPException(status_code=500, detail="Failed to save message")
-            
+
+        # Create contact message object
+        contact_message = ContactMessage(**contact_data.dict())
+        admission.duplicates.add(content_key, contact_message.id)
+
+        # Save to database, either through the batch writer or directly
+        with admission.slot():
+            if batch_writer is not None:
+                await batch_writer.submit(contact_message.dict())
+            else:
+                document = contact_message.dict()
+                if not await messages_repo.insert(document):
+                    raise HTTPException(status_code=500, detail="Failed to save message")
+                # The message is stored; a bookkeeping failure must not turn
+                # into an error the client would retry, as the batch path does
+                try:
+                    await after_insert([document])
+                except Exception as e:
+                    logging.error(f"Error in contact insert hook: {str(e)}")
+
+        content_key = None
+        return ContactMessageResponse(
+            success=True,
+            message="Thank you for your message! I'll get back to you soon.",
+            id=contact_message.id
+        )
+
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many submissions, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error saving contact message: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        # Release the duplicate reservation if the message was not stored
+        if content_key is not None:
+            admission.duplicates.discard(content_key)
 
-@api_router.get("/contact", response_model=List[ContactMessage])
-async def get_contact_messages(limit: int = 50):
+@api_router.get("/contact", response_model=List[Union[ContactMessage, ContactMessageSummary]])
+async def get_contact_messages(
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[MessageStatus] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    view: Literal["full", "summary"] = "full",
+):
     """
-    Get all contact messages (for admin use)
+    Get contact messages newest-first (for admin use).
+
+    Pages are keyed on (timestamp, _id); when more results exist the cursor for
+    the next page is returned in the X-Next-Cursor header.
     """
     try:
-        messages = await db.contact_messages.find().sort("timestamp", -1).limit(limit).to_list(limit)
-        return [ContactMessage(**message) for message in messages]
+        query = build_message_query(
+            status=status.value if status else None, since=since, until=until, cursor=cursor
+        )
+
+        async def load():
+            return await messages_repo.list(query, summary=view == "summary", limit=limit)
+
+        # Only the first page is cached; deeper pages are cheap keyset reads
+        if cursor is None:
+            key = ("messages", limit, status, since, until, view)
+            messages, next_cursor = await read_cache.get_or_load(key, load)
+        else:
+            messages, next_cursor = await load()
+
+        headers = {}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+
+        # Rows are projected to the response schema, so skip re-validation
+        return json_response(messages, headers=headers)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logging.error(f"Error fetching contact messages: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@api_router.get("/contact/stream")
+async def stream_contact_events(
+    request: Request,
+    last_event_id: Optional[str] = Query(None, alias="lastEventId"),
+):
+    """
+    Server-Sent Events feed of new messages and status changes; clients
+    resume with the Last-Event-ID header
+    """
+    last_event_id = request.headers.get("last-event-id", last_event_id)
+    resume = None
+    if last_event_id is not None:
+        try:
+            resume = parse_event_id(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    return StreamingResponse(
+        event_broker.stream(resume),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/contact/export")
+async def export_contact_messages(
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson",
+    status: Optional[MessageStatus] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batch_size: int = Query(1000, ge=1, le=10000),
+):
+    """
+    Stream contact messages as NDJSON, CSV or Parquet with bounded memory
+    """
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    query = build_message_query(
+        status=status.value if status else None, since=since, until=until
+    )
+    cursor = messages_repo.iterate(query, batch_size)
+
+    filename = f"contact_messages_{datetime.utcnow():%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(
+        EXPORTERS[format](cursor, batch_size),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.get("/contact/search", response_model=List[ContactMessageSearchResult])
+async def search_contact_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    status: Optional[MessageStatus] = None,
+):
+    """
+    Full-text search over name, email, subject and message, ranked by
+    relevance and then recency
+    """
+    try:
+        messages = await messages_repo.search(
+            q, status.value if status else None, limit=limit, offset=offset
+        )
+        return json_response(messages)
+    except Exception as e:
+        logging.error(f"Error searching contact messages: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @api_router.get("/contact/{message_id}", response_model=ContactMessage)
 async def get_contact_message(message_id: str):
     """
     Get a specific contact message by ID
     """
     try:
-        message = await db.contact_messages.find_one({"id": message_id})
+        message = await read_cache.get_or_load(
+            ("message", message_id),
+            lambda: messages_repo.get(message_id)
+        )
         if not message:
             raise HTTPException(status_code=404, detail="Message not found")
         return ContactMessage(**message)
@@ -83,19 +382,28 @@ async def get_contact_message(message_id: str):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @api_router.put("/contact/{message_id}/status")
-async def update_message_status(message_id: str, status: str):
+async def update_message_status(message_id: str, status: MessageStatus):
     """
     Update the status of a contact message
     """
+    status = status.value
     try:
-        result = await db.contact_messages.update_one(
-            {"id": message_id},
-            {"$set": {"status": status}}
-        )
-        
-        if result.modified_count == 0:
+        previous = await messages_repo.set_status(message_id, status)
+
+        if previous is None:
             raise HTTPException(status_code=404, detail="Message not found")
-            
+        if previous.get("status", "new") == status:
+            return {"success": True, "message": "Status unchanged"}
+
+        await record_status_change(db, previous.get("status", "new"), status)
+        await rollups.record_status_moves(
+            db, [(previous["timestamp"], previous.get("status", "new"), 1)], status
+        )
+        read_cache.invalidate(("message", message_id))
+        invalidate_listings()
+        if event_broker.local:
+            event_broker.publish("message.status", {"id": message_id, "status": status})
+
         return {"success": True, "message": "Status updated successfully"}
     except HTTPException:
         raise
@@ -103,6 +411,97 @@ async def update_message_status(message_id: str, status: str):
         logging.error(f"Error updating message status: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@api_router.post("/contact/bulk-status", response_model=BulkStatusResponse)
+async def bulk_update_message_status(update: BulkStatusUpdate):
+    """
+    Update the status of many contact messages, selected by id list or filter,
+    hot or archived, with one update_many per tier
+    """
+    status = update.status.value
+    try:
+        if update.ids is not None:
+            ids = list(dict.fromkeys(update.ids))
+            selector = ids_query(ids)
+            documents = await messages_repo.status_snapshot(ids)
+            previous = {message_id: doc.get("status", "new") for message_id, doc in documents.items()}
+            moves = [(doc["timestamp"], previous[message_id], 1) for message_id, doc in documents.items()]
+        else:
+            selector = build_message_query(
+                status=update.filter.status.value if update.filter.status else None,
+                since=update.filter.since,
+                until=update.filter.until
+            )
+            previous = None
+            moves = await messages_repo.status_counts_by_hour(selector)
+
+        old_counts = Counter()
+        for _, old_status, count in moves:
+            old_counts[old_status] += count
+
+        modified_count = await messages_repo.set_status_many(selector, status)
+
+        await record_bulk_status_change(db, old_counts, status)
+        await rollups.record_status_moves(db, moves, status)
+        if previous is not None:
+            for message_id in previous:
+                read_cache.invalidate(("message", message_id))
+        else:
+            read_cache.invalidate_where(lambda key: key[0] == "message")
+        invalidate_listings()
+        if event_broker.local:
+            if previous is not None:
+                for message_id, old_status in previous.items():
+                    if old_status != status:
+                        event_broker.publish("message.status", {"id": message_id, "status": status})
+            elif modified_count:
+                event_broker.publish("message.bulk_status", {
+                    "status": status,
+                    "filter": update.filter.model_dump(mode="json"),
+                    "modified_count": modified_count,
+                })
+
+        results = None
+        if previous is not None:
+            results = {
+                message_id: BulkStatusResult(
+                    matched=message_id in previous,
+                    modified=message_id in previous and previous[message_id] != status
+                )
+                for message_id in ids
+            }
+
+        return BulkStatusResponse(
+            success=True,
+            matched_count=sum(old_counts.values()),
+            modified_count=modified_count,
+            results=results
+        )
+    except Exception as e:
+        logging.error(f"Error bulk updating message status: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Portfolio content endpoints
+@api_router.get("/portfolio")
+async def get_portfolio(request: Request):
+    """
+    Get all portfolio content
+    """
+    if not portfolio_content.loaded:
+        raise HTTPException(status_code=503, detail="Portfolio content unavailable")
+    return portfolio_content.response(None, request)
+
+@api_router.get("/portfolio/{section}")
+async def get_portfolio_section(section: str, request: Request):
+    """
+    Get one portfolio section, e.g. projects or experience
+    """
+    if not portfolio_content.loaded:
+        raise HTTPException(status_code=503, detail="Portfolio content unavailable")
+    response = portfolio_content.response(section, request)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Section not found")
+    return response
+
 # Portfolio stats endpoint
 @api_router.get("/stats")
 async def get_portfolio_stats():
@@ -110,20 +509,129 @@ async def get_portfolio_stats():
     Get portfolio statistics
     """
     try:
-        total_messages = await db.contact_messages.count_documents({})
-        recent_messages = await db.contact_messages.count_documents({
-            "timestamp": {"$gte": datetime.utcnow().replace(day=1)}
-        })
-        
+        stats = await read_cache.get_or_load(("stats",), lambda: read_stats(db))
+        now = datetime.utcnow()
+
         return {
-            "total_messages": total_messages,
-            "messages_this_month": recent_messages,
-            "last_updated": datetime.utcnow()
+            "total_messages": stats.get("total", 0),
+            "archived_messages": stats.get("archived", 0),
+            "messages_this_month": stats.get("months", {}).get(month_key(now), 0),
+            "messages_by_status": stats.get("statuses", {}),
+            "last_updated": now
         }
     except Exception as e:
         logging.error(f"Error fetching stats: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@api_router.get("/stats/timeseries")
+async def get_stats_timeseries(
+    bucket: Literal["hour", "day", "week"] = "day",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    by_status: bool = False,
+):
+    """
+    Get submission counts per hour, day or week, optionally split by status
+    """
+    end = rollups.naive_utc(end) if end else datetime.utcnow()
+    start = rollups.naive_utc(start) if start else end - rollups.DEFAULT_SPAN[bucket]
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if (end - start) / rollups.step(bucket) > rollups.MAX_BUCKETS[bucket]:
+        raise HTTPException(status_code=400, detail="Requested range has too many buckets")
+
+    try:
+        return await rollups.timeseries(db, bucket, start, end, by_status=by_status)
+    except Exception as e:
+        logging.error(f"Error fetching stats timeseries: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@api_router.post("/admin/retention/run")
+async def run_retention(max_batches: Optional[int] = Query(None, ge=1)):
+    """
+    Archive messages matching the retention policy now
+    """
+    try:
+        return await retention_policy.run(db, max_batches=max_batches)
+    except Exception as e:
+        logging.error(f"Error running retention: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@api_router.post("/admin/stats/rollups/rebuild")
+async def rebuild_stats_rollups():
+    """
+    Recompute the time-series rollups from contact_messages
+    """
+    try:
+        return await rollups.rebuild_rollups(db)
+    except Exception as e:
+        logging.error(f"Error rebuilding rollups: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Prometheus metrics endpoint
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Expose request and MongoDB command metrics in Prometheus text format
+    """
+    return PlainTextResponse(
+        metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+# Index maintenance endpoint
+@api_router.get("/admin/indexes")
+async def get_index_report():
+    """
+    Report missing, unregistered and unused indexes
+    """
+    try:
+        return await check_indexes(db)
+    except Exception as e:
+        logging.error(f"Error checking indexes: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@api_router.get("/admin/cache")
+async def get_cache_stats():
+    """
+    Report read cache hit/miss/eviction counters
+    """
+    return read_cache.stats()
+
+@api_router.post("/admin/stats/reconcile")
+async def reconcile_portfolio_stats():
+    """
+    Recompute the stats counters from scratch and report any drift
+    """
+    try:
+        result = await reconcile_stats(db)
+        read_cache.invalidate(("stats",))
+        return result
+    except Exception as e:
+        logging.error(f"Error reconciling stats: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@api_router.get("/admin/notifications")
+async def get_notification_status():
+    """
+    Report notification outbox depth and dead letters per channel
+    """
+    try:
+        return await notifier.status(db)
+    except Exception as e:
+        logging.error(f"Error reading notification status: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@api_router.post("/admin/notifications/dead-letters/retry")
+async def retry_dead_letter_notifications(channel: Optional[str] = None):
+    """
+    Requeue dead-lettered notifications, optionally for one channel only
+    """
+    try:
+        return {"requeued": await notifier.retry_dead_letters(db, channel)}
+    except Exception as e:
+        logging.error(f"Error requeueing notifications: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -134,8 +642,12 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Request-ID"],
 )
 
+# Request metrics, outermost so CORS handling is included in the timings
+app.add_middleware(MetricsMiddleware, routes_provider=lambda: app.routes)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -143,14 +655,94 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def reconcile_stats_periodically():
+    while True:
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL)
+        try:
+            await reconcile_stats(db)
+            read_cache.invalidate(("stats",))
+        except Exception as e:
+            logger.error(f"Error reconciling stats: {str(e)}")
+
+async def build_rollups_if_missing():
+    try:
+        if not await rollups.rollups_ready(db):
+            await rollups.rebuild_rollups(db)
+    except Exception as e:
+        logger.error(f"Error building rollups: {str(e)}")
+
+async def run_retention_periodically():
+    while True:
+        try:
+            await retention_policy.run(db)
+        except Exception as e:
+            logger.error(f"Error running retention: {str(e)}")
+        await asyncio.sleep(retention_policy.interval)
+
 @app.on_event("startup")
 async def startup_db_client():
     logger.info("Portfolio API starting up...")
+    if admission.rate_limited and not os.environ.get('FORWARDED_ALLOW_IPS'):
+        logger.warning(
+            "Contact rate limiting keys on the client address; behind a reverse proxy "
+            "set FORWARDED_ALLOW_IPS to the proxy addresses or all clients share one limit"
+        )
+    global storage_config, client, db, messages_repo
+    storage_config = StorageConfig.from_env()
+    listeners = [MongoCommandMetrics()]
+    if slow_op_tracer is not None:
+        listeners.append(slow_op_tracer)
+    client, db = open_storage(storage_config, event_listeners=listeners)
+    if slow_op_tracer is not None:
+        slow_op_tracer.start(client)
+    messages_repo = repository_for(db, embedded=storage_config.embedded)
+    portfolio_content.start()
+    event_broker.start(db)
+    try:
+        await ensure_archive_collection(db, compressed=not storage_config.embedded)
+    except Exception as e:
+        logger.error(f"Error creating archive collection: {str(e)}")
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        logger.error(f"Error ensuring indexes: {str(e)}")
+    # Build the stats counters before serving; incremental updates skip
+    # them until they exist
+    try:
+        await read_stats(db)
+    except Exception as e:
+        logger.error(f"Error building stats counters: {str(e)}")
+    # Likewise for the time-series rollups; a rebuild another worker already
+    # started is left to finish
+    await build_rollups_if_missing()
+    if batch_writer is not None:
+        batch_writer.start()
+    if notifier.enabled:
+        notifier.start(db)
+    if STATS_RECONCILE_INTERVAL > 0:
+        global stats_reconcile_task
+        stats_reconcile_task = asyncio.create_task(reconcile_stats_periodically())
+    if retention_policy.enabled:
+        global retention_task
+        retention_task = asyncio.create_task(run_retention_periodically())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     logger.info("Portfolio API shutting down...")
-    client.close()
+    await portfolio_content.stop()
+    await event_broker.stop()
+    if stats_reconcile_task is not None:
+        stats_reconcile_task.cancel()
+    if retention_task is not None:
+        retention_task.cancel()
+    if batch_writer is not None:
+        await batch_writer.close()
+    if notifier.enabled:
+        await notifier.stop()
+    if client is not None:
+        client.close()
+    if slow_op_tracer is not None:
+        slow_op_tracer.stop()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,330 @@
+import asyncio
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from metrics import Counter, current_request, registry
+
+DEFAULT_LOG_PATH = Path(__file__).parent / "logs" / "slow_ops.jsonl"
+
+# Commands that explain() accepts and whose plan is worth looking at
+EXPLAINABLE = ("find", "aggregate", "count", "distinct", "findAndModify", "update", "delete")
+
+# Driver-added fields that are not part of the operation itself
+DRIVER_FIELDS = ("lsid", "txnNumber", "autocommit", "startTransaction")
+
+mongo_slow_commands_total = registry.register(Counter(
+    "mongodb_slow_commands_total", "MongoDB commands slower than the slow-op threshold",
+    ("collection", "command")
+))
+
+
+def query_shape(value: Any) -> Any:
+    """
+    The structure of a command with every literal replaced by "?", so log
+    records carry no message contents and equal queries group together
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(value[0])] if value else []
+    return "?"
+
+
+def plan_summary(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stages and indexes anywhere in an explain() reply
+    """
+    stages: List[str] = []
+    indexes: List[str] = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if "rejectedPlans" in node:
+                node = {key: item for key, item in node.items() if key != "rejectedPlans"}
+            stage = node.get("stage")
+            if isinstance(stage, str) and stage not in stages:
+                stages.append(stage)
+            index = node.get("indexName")
+            if isinstance(index, str) and index not in indexes:
+                indexes.append(index)
+            for item in node.values():
+                walk(item)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(explain)
+    return {"stages": stages, "indexes": indexes, "collscan": "COLLSCAN" in stages}
+
+
+class SlowOpTracer(monitoring.CommandListener):
+    """
+    PyMongo command listener that logs commands slower than `threshold_ms`
+    as JSON lines, with the route and request id that issued them.
+
+    A `explain_sample_rate` fraction of slow reads and writes is re-run as
+    explain("queryPlanner") on the event loop and the record notes whether
+    the plan was a collection scan. Records are handed to a background
+    thread for writing, so the driver threads never wait on the log file.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = 100.0,
+        explain_sample_rate: float = 0.1,
+        max_concurrent_explains: int = 4,
+        path: Path = DEFAULT_LOG_PATH,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.max_concurrent_explains = max_concurrent_explains
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._started: Dict[Tuple, Tuple[Any, Optional[Tuple[str, str, str]]]] = {}
+        self._lock = threading.Lock()
+        self._explaining = 0
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._log = logging.getLogger("slowops.records")
+        self._log.propagate = False
+
+    @classmethod
+    def from_env(cls) -> "SlowOpTracer":
+        return cls(
+            threshold_ms=float(os.environ.get("SLOW_OP_THRESHOLD_MS", "100")),
+            explain_sample_rate=float(os.environ.get("SLOW_OP_EXPLAIN_SAMPLE_RATE", "0.1")),
+            path=Path(os.environ.get("SLOW_OP_LOG_PATH", str(DEFAULT_LOG_PATH))),
+            max_bytes=int(os.environ.get("SLOW_OP_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backup_count=int(os.environ.get("SLOW_OP_LOG_BACKUPS", "5")),
+        )
+
+    def start(self, client):
+        """
+        Open the log file and remember the client and loop used for explain()
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            self.path, maxBytes=self.max_bytes, backupCount=self.backup_count
+        )
+        records: queue.Queue = queue.Queue()
+        self._log.handlers = [logging.handlers.QueueHandler(records)]
+        self._log.setLevel(logging.INFO)
+        self._listener = logging.handlers.QueueListener(records, handler)
+        self._listener.start()
+        self._client = client
+        self._loop = asyncio.get_running_loop()
+
+    def stop(self):
+        self._client = None
+        self._loop = None
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        self._log.handlers = []
+
+    @staticmethod
+    def _key(event):
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        if event.command_name == "explain":
+            return
+        with self._lock:
+            self._started[self._key(event)] = (event.command, current_request.get())
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            started = self._started.pop(self._key(event), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        command, request = started
+        target = command.get(event.command_name)
+        collection = target if isinstance(target, str) else command.get("collection")
+        mongo_slow_commands_total.inc(collection or "-", event.command_name)
+
+        operation = {
+            key: value for key, value in command.items()
+            if not key.startswith("$") and key not in DRIVER_FIELDS
+        }
+        method, route, request_id = request or (None, None, None)
+        record = {
+            "time": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "command": event.command_name,
+            "database": event.database_name,
+            "collection": collection,
+            "outcome": outcome,
+            "method": method,
+            "route": route,
+            "request_id": request_id,
+            "shape": query_shape(operation),
+        }
+
+        if self._should_explain(event.command_name):
+            explain = self._explain(event.database_name, operation, record)
+            try:
+                self._loop.call_soon_threadsafe(self._loop.create_task, explain)
+                return
+            except RuntimeError:
+                # The loop closed, e.g. a command finishing during shutdown
+                explain.close()
+                with self._lock:
+                    self._explaining -= 1
+        self._write(record)
+
+    def _should_explain(self, command_name: str) -> bool:
+        if command_name not in EXPLAINABLE or self._loop is None or self._client is None:
+            return False
+        if random.random() >= self.explain_sample_rate:
+            return False
+        with self._lock:
+            if self._explaining >= self.max_concurrent_explains:
+                return False
+            self._explaining += 1
+        return True
+
+    async def _explain(self, database: str, operation: Dict[str, Any], record: Dict[str, Any]):
+        try:
+            explain = await self._client[database].command(
+                {"explain": operation, "verbosity": "queryPlanner"}
+            )
+            record["plan"] = plan_summary(explain)
+        except Exception as e:
+            record["plan_error"] = str(e)
+        finally:
+            with self._lock:
+                self._explaining -= 1
+        self._write(record)
+
+    def _write(self, record: Dict[str, Any]):
+        if self._log.handlers:
+            self._log.info(json.dumps(record, default=str))
+
+
+def read_records(path: Path) -> List[Dict[str, Any]]:
+    """
+    Every record in the log file and its rotated backups, oldest first
+    """
+    # Rotated backups are <name>.1 (newest) to <name>.<backupCount>
+    backups = [file for file in path.parent.glob(path.name + ".*") if file.suffix[1:].isdigit()]
+    backups.sort(key=lambda file: int(file.suffix[1:]), reverse=True)
+    records = []
+    for file in backups + [path]:
+        if not file.exists():
+            continue
+        with open(file) as lines:
+            for line in lines:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def summarize(records: List[Dict[str, Any]], top: int = 10) -> List[Dict[str, Any]]:
+    """
+    Group records by command, collection and query shape, worst total time first
+    """
+    groups: Dict[Tuple, Dict[str, Any]] = {}
+    for record in records:
+        key = (record["command"], record["collection"], json.dumps(record["shape"], sort_keys=True))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "command": record["command"],
+                "collection": record["collection"],
+                "shape": record["shape"],
+                "count": 0,
+                "total_ms": 0.0,
+                "durations": [],
+                "routes": set(),
+                "collscan": False,
+                "indexes": set(),
+            }
+        group["count"] += 1
+        group["total_ms"] += record["duration_ms"]
+        group["durations"].append(record["duration_ms"])
+        if record.get("route"):
+            group["routes"].add(f"{record['method']} {record['route']}")
+        plan = record.get("plan")
+        if plan:
+            group["collscan"] = group["collscan"] or plan["collscan"]
+            group["indexes"].update(plan["indexes"])
+
+    summary = []
+    for group in sorted(groups.values(), key=lambda group: group["total_ms"], reverse=True)[:top]:
+        durations = sorted(group.pop("durations"))
+        summary.append({
+            **group,
+            "total_ms": round(group["total_ms"], 3),
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "max_ms": durations[-1],
+            "routes": sorted(group["routes"]),
+            "indexes": sorted(group["indexes"]),
+        })
+    return summary
+
+
+if __name__ == "__main__":
+    import typer
+
+    cli = typer.Typer(help="Inspect the MongoDB slow-operation log")
+
+    @cli.callback()
+    def main():
+        pass
+
+    @cli.command()
+    def summary(
+        path: Path = typer.Option(
+            Path(os.environ.get("SLOW_OP_LOG_PATH", str(DEFAULT_LOG_PATH))), help="Slow-op log file"
+        ),
+        top: int = typer.Option(10, help="Number of query shapes to show"),
+        as_json: bool = typer.Option(False, "--json", help="Print the summary as JSON"),
+    ):
+        """Show the query shapes that spent the most time above the threshold."""
+        groups = summarize(read_records(path), top)
+        if as_json:
+            typer.echo(json.dumps(groups, indent=2))
+            return
+        if not groups:
+            typer.echo("No slow operations recorded")
+            return
+        for rank, group in enumerate(groups, 1):
+            flag = "  COLLSCAN" if group["collscan"] else ""
+            typer.echo(
+                f"{rank}. {group['command']} {group['collection']}: {group['count']} ops, "
+                f"total {group['total_ms']:.1f} ms, p95 {group['p95_ms']:.1f} ms, "
+                f"max {group['max_ms']:.1f} ms{flag}"
+            )
+            typer.echo(f"   shape:   {json.dumps(group['shape'])}")
+            if group["routes"]:
+                typer.echo(f"   routes:  {', '.join(group['routes'])}")
+            if group["indexes"]:
+                typer.echo(f"   indexes: {', '.join(group['indexes'])}")
+
+    cli()
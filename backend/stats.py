@@ -0,0 +1,164 @@
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable
+
+from pymongo.errors import DuplicateKeyError
+
+from retention import ARCHIVE_COLLECTION, MESSAGE_COLLECTIONS
+
+logger = logging.getLogger(__name__)
+
+STATS_COLLECTION = "portfolio_stats"
+STATS_ID = "contact_messages"
+
+# The incremental updates below never upsert: on a database that already
+# holds messages, a counters document created by a single $inc would only
+# count that write. Until read_stats() has built the document from scratch
+# they are no-ops, and the build includes everything stored so far.
+
+
+def month_key(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m")
+
+
+def _increments(documents: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    counts = Counter()
+    for document in documents:
+        counts["total"] += 1
+        counts[f"months.{month_key(document['timestamp'])}"] += 1
+        counts[f"statuses.{document.get('status', 'new')}"] += 1
+    return dict(counts)
+
+
+async def record_inserts(db, documents) -> None:
+    """
+    Add newly stored messages to the counters in a single atomic $inc
+    """
+    increments = _increments(documents)
+    if increments:
+        await db[STATS_COLLECTION].update_one(
+            {"_id": STATS_ID}, {"$inc": increments}
+        )
+
+
+async def record_archived(db, count: int) -> None:
+    """
+    Count messages moved to the archive tier; they stay in every other counter
+    """
+    if count:
+        await db[STATS_COLLECTION].update_one(
+            {"_id": STATS_ID}, {"$inc": {"archived": count}}
+        )
+
+
+async def record_status_change(db, old_status: str, new_status: str, count: int = 1) -> None:
+    if old_status == new_status or count == 0:
+        return
+    await db[STATS_COLLECTION].update_one(
+        {"_id": STATS_ID},
+        {"$inc": {f"statuses.{old_status}": -count, f"statuses.{new_status}": count}}
+    )
+
+
+async def record_bulk_status_change(db, old_counts: Dict[str, int], new_status: str) -> None:
+    """
+    Move counts from several previous statuses to `new_status` in one $inc
+    """
+    increments = Counter()
+    for old_status, count in old_counts.items():
+        if old_status != new_status and count:
+            increments[f"statuses.{old_status}"] -= count
+            increments[f"statuses.{new_status}"] += count
+    if increments:
+        await db[STATS_COLLECTION].update_one(
+            {"_id": STATS_ID}, {"$inc": dict(increments)}
+        )
+
+
+async def read_stats(db) -> Dict[str, Any]:
+    """
+    Return the materialized counters, rebuilding them if they do not exist yet
+    """
+    stats = await db[STATS_COLLECTION].find_one({"_id": STATS_ID})
+    if stats is None:
+        await reconcile_stats(db)
+        stats = await db[STATS_COLLECTION].find_one({"_id": STATS_ID})
+    return stats
+
+
+async def compute_stats(db) -> Dict[str, Any]:
+    """
+    Recompute the counters from the hot and archived messages, with one
+    aggregation per collection
+    """
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "month": {"$dateToString": {"format": "%Y-%m", "date": "$timestamp"}},
+                "status": "$status",
+            },
+            "count": {"$sum": 1},
+        }},
+    ]
+    total = 0
+    months = Counter()
+    statuses = Counter()
+    for collection in MESSAGE_COLLECTIONS:
+        async for row in db[collection].aggregate(pipeline):
+            total += row["count"]
+            months[row["_id"]["month"]] += row["count"]
+            statuses[row["_id"]["status"]] += row["count"]
+    archived = await db[ARCHIVE_COLLECTION].count_documents({})
+    return {"total": total, "archived": archived, "months": dict(months), "statuses": dict(statuses)}
+
+
+def _diff(stored: Dict[str, Any], fresh: Dict[str, Any]) -> Dict[str, Any]:
+    drift = {}
+    for field in ("total", "archived"):
+        if stored.get(field, 0) != fresh[field]:
+            drift[field] = fresh[field] - stored.get(field, 0)
+    for field in ("months", "statuses"):
+        old = stored.get(field, {})
+        new = fresh[field]
+        for key in set(old) | set(new):
+            delta = new.get(key, 0) - old.get(key, 0)
+            if delta:
+                drift[f"{field}.{key}"] = delta
+    return drift
+
+
+async def reconcile_stats(db, attempts: int = 3) -> Dict[str, Any]:
+    """
+    Recompute the counters from scratch, correct the stored ones and return
+    any drift found (fresh value minus stored value, per counter).
+
+    The correction is an $inc, so increments landing after the aggregation
+    are kept. One landing while it runs would be counted by both, so the
+    counters are read again afterwards and the pass is retried if they moved.
+    """
+    for _ in range(attempts):
+        stored = await db[STATS_COLLECTION].find_one({"_id": STATS_ID})
+        fresh = await compute_stats(db)
+        if stored is None:
+            try:
+                await db[STATS_COLLECTION].insert_one(
+                    {"_id": STATS_ID, **fresh, "reconciled_at": datetime.utcnow()}
+                )
+            except DuplicateKeyError:
+                # Built by another worker meanwhile; check its counts instead
+                continue
+            return {"drift": {}, **fresh}
+
+        if await db[STATS_COLLECTION].find_one({"_id": STATS_ID}) != stored:
+            continue
+        drift = _diff(stored, fresh)
+        update: Dict[str, Any] = {"$set": {"reconciled_at": datetime.utcnow()}}
+        if drift:
+            update["$inc"] = drift
+            logger.warning(f"Stats drift corrected: {drift}")
+        await db[STATS_COLLECTION].update_one({"_id": STATS_ID}, update)
+        return {"drift": drift, **fresh}
+
+    logger.warning(f"Stats kept changing while being reconciled; gave up after {attempts} attempts")
+    return {"drift": None, **fresh}
@@ -0,0 +1,93 @@
+import logging
+import os
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ENGINE_MONGO = "mongo"
+ENGINE_MEMORY = "memory"
+
+
+class StorageConfig:
+    """
+    Storage settings read from the environment.
+
+    `mongo` connects to MONGO_URL with Motor. `memory` runs an embedded,
+    in-process engine (mongomock-motor) that speaks the same collection API,
+    so the whole app runs without external services; data does not survive
+    a restart. STORAGE_ENGINE defaults to `mongo`, so a deployment missing
+    MONGO_URL fails to start instead of silently keeping submissions in
+    memory; the embedded engine has to be asked for.
+    """
+
+    def __init__(
+        self,
+        engine: str,
+        mongo_url: Optional[str] = None,
+        db_name: str = "portfolio",
+        max_pool_size: int = 100,
+        min_pool_size: int = 0,
+        connect_timeout_ms: int = 5000,
+        server_selection_timeout_ms: int = 5000,
+        socket_timeout_ms: Optional[int] = None,
+    ):
+        if engine not in (ENGINE_MONGO, ENGINE_MEMORY):
+            raise ValueError(f"Unknown storage engine: {engine}")
+        if engine == ENGINE_MONGO and not mongo_url:
+            raise ValueError(
+                "MONGO_URL is required for the mongo storage engine; "
+                "set STORAGE_ENGINE=memory to run on the volatile in-memory engine"
+            )
+        self.engine = engine
+        self.mongo_url = mongo_url
+        self.db_name = db_name
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.connect_timeout_ms = connect_timeout_ms
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+        self.socket_timeout_ms = socket_timeout_ms
+
+    @classmethod
+    def from_env(cls) -> "StorageConfig":
+        mongo_url = os.environ.get("MONGO_URL")
+        socket_timeout = os.environ.get("MONGO_SOCKET_TIMEOUT_MS")
+        return cls(
+            engine=os.environ.get("STORAGE_ENGINE", ENGINE_MONGO),
+            mongo_url=mongo_url,
+            db_name=os.environ.get("DB_NAME", "portfolio"),
+            max_pool_size=int(os.environ.get("MONGO_MAX_POOL_SIZE", "100")),
+            min_pool_size=int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")),
+            connect_timeout_ms=int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+            server_selection_timeout_ms=int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+            socket_timeout_ms=int(socket_timeout) if socket_timeout else None,
+        )
+
+    @property
+    def embedded(self) -> bool:
+        return self.engine == ENGINE_MEMORY
+
+
+def open_storage(config: StorageConfig, event_listeners: Optional[List[Any]] = None) -> Tuple[Any, Any]:
+    """
+    Create the client for the configured engine and return (client, db).
+    Motor connects lazily, so this does no network I/O.
+    """
+    if config.embedded:
+        from mongomock_motor import AsyncMongoMockClient
+
+        logger.warning("Using the embedded in-memory storage engine; data is lost on restart")
+        client = AsyncMongoMockClient()
+        return client, client[config.db_name]
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(
+        config.mongo_url,
+        maxPoolSize=config.max_pool_size,
+        minPoolSize=config.min_pool_size,
+        connectTimeoutMS=config.connect_timeout_ms,
+        serverSelectionTimeoutMS=config.server_selection_timeout_ms,
+        socketTimeoutMS=config.socket_timeout_ms,
+        event_listeners=event_listeners or [],
+    )
+    return client, client[config.db_name]
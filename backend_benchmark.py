@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Concurrent load and latency benchmark for the Prajwal H S Portfolio API
+
+Drives the FastAPI app in-process over ASGI (default) or a running server
+(--url) with an async client at a fixed concurrency, and reports req/s and
+p50/p95/p99 latency per endpoint. Results are written as JSON so runs can be
+compared across commits. When benchmarking a running server with --url,
+start it with CONTACT_RATE_PER_MINUTE=0 so rate limiting does not reject the
+load.
+
+Examples:
+    python backend_benchmark.py --mongo mock --requests 2000 --concurrency 50
+    python backend_benchmark.py --mongo local --concurrency 100
+    python backend_benchmark.py --url http://localhost:8001
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+ROOT_DIR = Path(__file__).parent
+BACKEND_DIR = ROOT_DIR / "backend"
+
+CONTACT_DATA = {
+    "name": "Sarah Johnson",
+    "email": "sarah.johnson@techcorp.com",
+    "subject": "Full-Stack Developer Position Inquiry",
+    "message": "Hi Prajwal, I came across your portfolio and I'm impressed with your work. "
+               "We have an exciting full-stack developer position at TechCorp that might interest you."
+}
+
+
+def contact_data(tag):
+    """Unique submission so duplicate suppression does not short-circuit the insert"""
+    return {**CONTACT_DATA, "message": f"{CONTACT_DATA['message']} [{tag}]"}
+
+
+def load_app(mongo):
+    """Import the FastAPI app against the requested Mongo stand-in"""
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault("DB_NAME", f"portfolio_bench_{uuid.uuid4().hex[:8]}")
+    # All load comes from one client address, so per-client rate limiting
+    # would reject nearly everything
+    os.environ.setdefault("CONTACT_RATE_PER_MINUTE", "0")
+    # The embedded engine keeps everything in memory; useful for comparing
+    # the API layer itself across commits, not Mongo performance
+    os.environ["STORAGE_ENGINE"] = "memory" if mongo == "mock" else "mongo"
+    # httpx logs every request at INFO once the app configures logging,
+    # which would flood the output and slow the load generator
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    import server
+    return server.app
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, statuses, elapsed):
+    return {
+        "requests": len(latencies),
+        "errors": sum(1 for status in statuses if status >= 400),
+        "req_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3) if latencies else None,
+            "p50": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+            "p95": round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+            "p99": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+            "max": round(max(latencies) * 1000, 3) if latencies else None,
+        },
+    }
+
+
+async def run_endpoint(client, name, make_request, total, concurrency):
+    """Issue `total` requests with at most `concurrency` in flight"""
+    latencies = []
+    statuses = []
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, statuses, elapsed)
+    lat = result["latency_ms"]
+    print(f"   {name:<24} {result['req_per_sec']:>9} req/s   "
+          f"p50 {lat['p50']:>8} ms   p95 {lat['p95']:>8} ms   p99 {lat['p99']:>8} ms   "
+          f"errors {result['errors']}")
+    return result
+
+
+async def run_benchmark(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30)
+        app = None
+    else:
+        app = load_app(args.mongo)
+        await app.router.startup()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30
+        )
+
+    results = {}
+    try:
+        # Seed enough messages for list/get/stats to be meaningful
+        seeded = []
+        for i in range(args.seed):
+            response = await client.post("/api/contact", json=contact_data(f"seed-{i}"))
+            seeded.append(response.json().get("id"))
+        seeded = [message_id for message_id in seeded if message_id]
+        if not seeded:
+            print("❌ Could not seed any messages")
+            return None
+
+        run_id = uuid.uuid4().hex[:8]
+
+        async def post_contact(client, i):
+            return await client.post("/api/contact", json=contact_data(f"{run_id}-{i}"))
+
+        async def list_contacts(client, i):
+            return await client.get("/api/contact", params={"limit": args.page_size})
+
+        async def get_contact(client, i):
+            return await client.get(f"/api/contact/{seeded[i % len(seeded)]}")
+
+        async def get_stats(client, i):
+            return await client.get("/api/stats")
+
+        endpoints = {
+            "POST /api/contact": post_contact,
+            "GET /api/contact": list_contacts,
+            "GET /api/contact/{id}": get_contact,
+            "GET /api/stats": get_stats,
+        }
+
+        print(f"\n🚀 {args.requests} requests per endpoint at concurrency {args.concurrency}")
+        for name, make_request in endpoints.items():
+            # Warm up connection pools and caches before measuring
+            for i in range(min(args.warmup, args.requests)):
+                await make_request(client, i)
+            results[name] = await run_endpoint(
+                client, name, make_request, args.requests, args.concurrency
+            )
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--mongo", choices=["mock", "local"], default="mock",
+                        help="In-process storage: embedded in-memory engine or MONGO_URL from backend/.env")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=200, help="Messages inserted before measuring")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--output", help="JSON results path (default: bench_results/<revision>.json)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmark(args))
+    if results is None:
+        sys.exit(1)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "target": args.url or f"asgi ({args.mongo} mongo)",
+        "python": platform.python_version(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "page_size": args.page_size,
+        },
+        "endpoints": results,
+    }
+    output = Path(args.output or ROOT_DIR / "bench_results" / f"{report['revision'] or 'unknown'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\n📊 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
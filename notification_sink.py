@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Local SMTP and webhook stand-ins for exercising owner notifications
+
+Runs an aiosmtpd server and a minimal HTTP webhook receiver that print
+everything they get. --fail-rate makes a fraction of deliveries fail so
+retries, backoff and the dead-letter queue can be watched end to end.
+
+Start the sink, then the API pointed at it:
+    python notification_sink.py --fail-rate 0.3
+    NOTIFY_SMTP_HOST=localhost NOTIFY_SMTP_PORT=8025 NOTIFY_EMAIL_TO=owner@localhost \\
+    NOTIFY_WEBHOOK_URL=http://localhost:8026/hook python backend/server.py
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from aiosmtpd.controller import Controller
+
+
+class SmtpHandler:
+    def __init__(self, fail_rate):
+        self.fail_rate = fail_rate
+
+    async def handle_DATA(self, server, session, envelope):
+        if random.random() < self.fail_rate:
+            print("[smtp] rejecting message")
+            return "451 Temporary failure, try again"
+        print(f"[smtp] {envelope.mail_from} -> {', '.join(envelope.rcpt_tos)}")
+        print(envelope.content.decode("utf8", errors="replace"))
+        return "250 OK"
+
+
+def webhook_handler(fail_rate):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if random.random() < fail_rate:
+                print("[webhook] rejecting delivery")
+                self.send_response(503)
+                self.end_headers()
+                return
+            payload = json.loads(body)
+            print(f"[webhook] {len(payload['messages'])} message(s)")
+            print(json.dumps(payload, indent=2))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--webhook-port", type=int, default=8026)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of deliveries to reject")
+    args = parser.parse_args()
+
+    controller = Controller(SmtpHandler(args.fail_rate), hostname=args.host, port=args.smtp_port)
+    controller.start()
+    httpd = ThreadingHTTPServer((args.host, args.webhook_port), webhook_handler(args.fail_rate))
+    Thread(target=httpd.serve_forever, daemon=True).start()
+    print(f"SMTP on {args.host}:{args.smtp_port}, webhook on http://{args.host}:{args.webhook_port}/hook")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        httpd.shutdown()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
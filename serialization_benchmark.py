@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the GET /api/contact serialization path
+
+Compares the original path (ContactMessage(**row) per row, response_model
+re-validation, jsonable_encoder and the stdlib JSON encoder) with the fast
+path (projected rows encoded directly by pydantic-core) at several page sizes.
+
+    python serialization_benchmark.py --rows 50 500 5000
+"""
+
+import argparse
+import json
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models import ContactMessage
+from serialization import json_response
+
+RESPONSE_ADAPTER = TypeAdapter(List[ContactMessage])
+
+
+def make_rows(count):
+    now = datetime.utcnow()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "name": "Sarah Johnson",
+            "email": "sarah.johnson@techcorp.com",
+            "subject": "Full-Stack Developer Position Inquiry",
+            "message": "Hi Prajwal, I came across your portfolio and I'm impressed with your work. " * 3,
+            "timestamp": now - timedelta(minutes=i),
+            "status": "new",
+        }
+        for i in range(count)
+    ]
+
+
+def original_path(rows):
+    # Mirrors the handler building models followed by FastAPI's
+    # response_model validation and JSONResponse rendering
+    models = [ContactMessage(**row) for row in rows]
+    validated = RESPONSE_ADAPTER.validate_python(models)
+    content = jsonable_encoder(RESPONSE_ADAPTER.dump_python(validated, mode="json"))
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(rows):
+    return json_response(rows).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>6} {'original ms':>12} {'fast ms':>10} {'speedup':>8}")
+    for count in args.rows:
+        rows = make_rows(count)
+        assert json.loads(original_path(rows)) == json.loads(fast_path(rows))
+        number = max(1, 5000 // count)
+        original = min(timeit.repeat(lambda: original_path(rows), number=number, repeat=args.repeat)) / number
+        fast = min(timeit.repeat(lambda: fast_path(rows), number=number, repeat=args.repeat)) / number
+        print(f"{count:>6} {original * 1000:>12.3f} {fast * 1000:>10.3f} {original / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+os.environ.setdefault("STORAGE_ENGINE", "memory")
+
+from storage import StorageConfig, open_storage  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    client, db = open_storage(StorageConfig.from_env())
+    yield db
+    client.close()
+
+
+@pytest.fixture
+def run():
+    return asyncio.run
+
+
+@pytest.fixture
+def api(db, monkeypatch):
+    """
+    The API module wired to the test database without its startup hook,
+    with fresh admission state and no batch writer
+    """
+    import server
+    from admission import AdmissionController
+    from repository import repository_for
+
+    monkeypatch.setattr(server, "storage_config", StorageConfig.from_env())
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "messages_repo", repository_for(db, embedded=True))
+    monkeypatch.setattr(server, "admission", AdmissionController())
+    monkeypatch.setattr(server, "batch_writer", None)
+    return server
+
+
+@pytest.fixture
+def http(api):
+    """
+    Factory for HTTP clients talking to the app in process
+    """
+    import httpx
+
+    return lambda: httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://test")
+
+
+@pytest.fixture
+def submission():
+    """
+    Factory for contact form bodies; keyword arguments replace fields
+    """
+    def make(**fields):
+        return {
+            "name": "Sender",
+            "email": "sender@example.com",
+            "subject": "Hello",
+            "message": "A message",
+            **fields,
+        }
+
+    return make
+
+
+@pytest.fixture
+def message(submission):
+    """
+    Factory for API-shaped stored messages with a fresh id, new and from
+    2024-01-01 unless keyword arguments say otherwise
+    """
+    def make(**fields):
+        return {
+            "id": str(uuid.uuid4()),
+            **submission(),
+            "timestamp": datetime(2024, 1, 1),
+            "status": "new",
+            **fields,
+        }
+
+    return make
+
+
+@pytest.fixture
+def compact_message(message):
+    """
+    Factory for messages in the compact storage layout
+    """
+    from schema import encode_message
+
+    return lambda **fields: encode_message(message(**fields))
@@ -0,0 +1,89 @@
+import pytest
+
+import admission
+from admission import AdmissionController, AdmissionRejected, TokenBucketLimiter
+
+def test_token_bucket_allows_a_burst_then_refills(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    limiter = TokenBucketLimiter(rate=0.5, burst=2)
+
+    assert limiter.acquire("a") is None
+    assert limiter.acquire("a") is None
+    assert limiter.acquire("a") == pytest.approx(2.0)
+    # Other clients have their own bucket
+    assert limiter.acquire("b") is None
+
+    now[0] += 2
+    assert limiter.acquire("a") is None
+    assert limiter.acquire("a") is not None
+
+
+def test_rate_limit_is_off_unless_configured(monkeypatch):
+    monkeypatch.delenv("CONTACT_RATE_PER_MINUTE", raising=False)
+    controller = AdmissionController.from_env()
+
+    assert not controller.rate_limited
+    for _ in range(100):
+        controller.check_rate("proxy")
+
+
+def test_rate_limit_is_a_429_with_retry_after(api, http, run, submission, monkeypatch):
+    monkeypatch.setattr(api, "admission", AdmissionController(rate_per_minute=1, burst=1))
+
+    async def scenario():
+        async with http() as client:
+            first = await client.post("/api/contact", json=submission())
+            second = await client.post("/api/contact", json=submission(message="Another"))
+        return first, second
+
+    first, second = run(scenario())
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert second.headers["Retry-After"] == "60"
+
+
+def test_duplicates_are_acknowledged_without_storing(api, http, run, db, submission):
+    async def scenario():
+        async with http() as client:
+            first = await client.post("/api/contact", json=submission())
+            # Case and surrounding whitespace do not make a new message
+            second = await client.post("/api/contact", json=submission(email=" Sender@Example.com "))
+        return first.json(), second.json(), await db.contact_messages.count_documents({})
+
+    first, second, stored = run(scenario())
+    assert first["id"] == second["id"]
+    assert stored == 1
+
+
+def test_failed_insert_releases_the_duplicate_reservation(api, http, run, db, submission, monkeypatch):
+    insert = api.messages_repo.insert
+    failures = [RuntimeError("primary stepped down")]
+
+    async def flaky_insert(document):
+        if failures:
+            raise failures.pop()
+        return await insert(document)
+
+    monkeypatch.setattr(api.messages_repo, "insert", flaky_insert)
+
+    async def scenario():
+        async with http() as client:
+            failed = await client.post("/api/contact", json=submission())
+            retried = await client.post("/api/contact", json=submission())
+        return failed, retried, await db.contact_messages.count_documents({})
+
+    failed, retried, stored = run(scenario())
+    assert failed.status_code == 500
+    assert retried.status_code == 200
+    assert stored == 1
+
+
+def test_concurrency_cap_rejects_beyond_max_inflight():
+    controller = AdmissionController(max_inflight=1)
+    with controller.slot():
+        with pytest.raises(AdmissionRejected) as error:
+            with controller.slot():
+                pass
+        assert error.value.reason == "concurrency"
+    assert controller.inflight == 0
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from batching import ACK_ON_ENQUEUE, BatchWriter, QueueFullError
+
+class Sink:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, documents):
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("insert failed")
+        self.batches.append([document.get("n") for document in documents])
+
+
+def test_flush_ack_waits_for_the_grouped_write(run):
+    sink = Sink()
+    writer = BatchWriter(sink, max_batch_size=3, max_delay=0.05)
+
+    async def scenario():
+        writer.start()
+        await asyncio.gather(*(writer.submit({"n": n}) for n in range(5)))
+        # Every submit returned only once its batch was written
+        written = list(sink.batches)
+        await writer.close()
+        return written
+
+    assert run(scenario()) == [[0, 1, 2], [3, 4]]
+
+
+def test_flush_ack_surfaces_write_failures(run):
+    writer = BatchWriter(Sink(fail=True), max_delay=0.01)
+
+    async def scenario():
+        writer.start()
+        with pytest.raises(RuntimeError):
+            await writer.submit({"n": 0})
+        await writer.close()
+
+    run(scenario())
+
+
+class PartialSink(Sink):
+    """
+    Fails the documents whose `n` is listed, once each, as an unordered insert_many does
+    """
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = set(failing)
+        self.flushed = []
+
+    async def __call__(self, documents):
+        failed = [index for index, document in enumerate(documents) if document["n"] in self.failing]
+        self.failing -= {documents[index]["n"] for index in failed}
+        self.batches.append([document["n"] for index, document in enumerate(documents) if index not in failed])
+        if failed:
+            errors = [{"index": index, "code": 91, "errmsg": "shutdown in progress"} for index in failed]
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(documents) - len(failed)})
+
+    async def on_flush(self, documents):
+        self.flushed.append([document["n"] for document in documents])
+
+
+def test_partial_failure_only_fails_the_documents_not_written(run):
+    sink = PartialSink(failing=[1])
+    writer = BatchWriter(sink, max_batch_size=3, max_delay=0.05, on_flush=sink.on_flush)
+
+    async def scenario():
+        writer.start()
+        results = await asyncio.gather(*(writer.submit({"n": n}) for n in range(3)), return_exceptions=True)
+        await writer.close()
+        return results
+
+    results = run(scenario())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], BulkWriteError)
+    assert sink.flushed == [[0, 2]]
+
+
+def test_enqueue_ack_retries_the_documents_not_written(run):
+    sink = PartialSink(failing=[1])
+    writer = BatchWriter(sink, max_batch_size=3, max_delay=0.01, ack_mode=ACK_ON_ENQUEUE, retry_delay=0,
+                         on_flush=sink.on_flush)
+
+    async def scenario():
+        writer.start()
+        for n in range(3):
+            await writer.submit({"n": n})
+        await writer.close()
+
+    run(scenario())
+    assert sink.batches == [[0, 2], [1]]
+    assert sink.flushed == [[0, 2], [1]]
+
+
+def test_enqueue_ack_returns_before_the_write_and_close_drains(run):
+    sink = Sink()
+    sink.release.clear()
+    writer = BatchWriter(sink, max_batch_size=2, max_delay=0.01, ack_mode=ACK_ON_ENQUEUE)
+
+    async def scenario():
+        writer.start()
+        for n in range(5):
+            await writer.submit({"n": n})
+        assert sink.batches == []
+        sink.release.set()
+        await writer.close()
+        with pytest.raises(QueueFullError):
+            await writer.submit({"n": 5})
+        return sink.batches
+
+    assert sorted(n for batch in run(scenario()) for n in batch) == [0, 1, 2, 3, 4]
+
+
+def test_full_queue_is_a_503_and_releases_the_duplicate_reservation(api, http, run, submission, monkeypatch):
+    sink = Sink()
+    sink.release.clear()
+    writer = BatchWriter(sink, max_batch_size=1, max_delay=0, max_queue_size=1, ack_mode=ACK_ON_ENQUEUE,
+                         retry_after=7)
+    monkeypatch.setattr(api, "batch_writer", writer)
+
+    async def scenario():
+        writer.start()
+        async with http() as client:
+            # The first is taken by the flusher, the second fills the queue
+            for index in range(2):
+                body = submission(message=f"Message {index}")
+                assert (await client.post("/api/contact", json=body)).status_code == 200
+                await asyncio.sleep(0.01)
+            rejected = await client.post("/api/contact", json=submission())
+            sink.release.set()
+            await writer.close()
+            writer.start()
+            retried = await client.post("/api/contact", json=submission())
+            await writer.close()
+        return rejected, retried
+
+    rejected, retried = run(scenario())
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == "7"
+    # Not acknowledged as a duplicate of the rejected attempt
+    assert retried.status_code == 200
+    assert len(sink.batches) == 3
@@ -0,0 +1,100 @@
+import uuid
+from datetime import datetime
+
+
+def bulk_update(db, http, run, documents, body):
+    async def scenario():
+        await db.contact_messages.insert_many([dict(document) for document in documents])
+        async with http() as client:
+            response = await client.post("/api/contact/bulk-status", json=body)
+            statuses = [
+                (await client.get(f"/api/contact/{document['id']}")).json()["status"] for document in documents
+            ]
+        return response, statuses
+
+    return run(scenario())
+
+
+def test_ids_get_a_result_each(api, db, http, run, message):
+    documents = [
+        message(status=status, timestamp=datetime(2024, 1, day))
+        for status, day in [("new", 1), ("read", 2), ("new", 3)]
+    ]
+    first, second, _ = (document["id"] for document in documents)
+    missing = str(uuid.uuid4())
+
+    # Repeated ids count once
+    body = {"status": "read", "ids": [first, second, missing, first]}
+    response, statuses = bulk_update(db, http, run, documents, body)
+    assert response.status_code == 200
+    assert response.json() == {
+        "success": True,
+        "matched_count": 2,
+        "modified_count": 1,
+        "results": {
+            first: {"matched": True, "modified": True},
+            second: {"matched": True, "modified": False},
+            missing: {"matched": False, "modified": False},
+        },
+    }
+    assert statuses == ["read", "read", "new"]
+
+
+def test_filter_updates_every_match(api, db, http, run, message):
+    documents = [
+        message(status=status, timestamp=datetime(2024, 1, day))
+        for status, day in [("new", 1), ("new", 5), ("read", 2)]
+    ]
+
+    body = {"status": "spam", "filter": {"status": "new", "until": "2024-01-03T00:00:00"}}
+    response, statuses = bulk_update(db, http, run, documents, body)
+    assert response.json() == {"success": True, "matched_count": 1, "modified_count": 1, "results": None}
+    assert statuses == ["spam", "new", "read"]
+
+
+def test_ids_and_filter_are_exclusive(api, http, run):
+    async def scenario():
+        async with http() as client:
+            both = await client.post("/api/contact/bulk-status", json={
+                "status": "read", "ids": [str(uuid.uuid4())], "filter": {"status": "new"}
+            })
+            neither = await client.post("/api/contact/bulk-status", json={"status": "read"})
+            unknown = await client.post("/api/contact/bulk-status", json={
+                "status": "responded", "ids": [str(uuid.uuid4())]
+            })
+        return both, neither, unknown
+
+    assert [response.status_code for response in run(scenario())] == [422, 422, 422]
+
+
+def test_empty_filter_has_to_ask_for_every_message(api, db, http, run, message):
+    documents = [
+        message(status=status, timestamp=datetime(2024, 1, day))
+        for status, day in [("new", 1), ("read", 2)]
+    ]
+
+    async def scenario():
+        async with http() as client:
+            return await client.post("/api/contact/bulk-status", json={"status": "spam", "filter": {}})
+
+    assert run(scenario()).status_code == 422
+
+    body = {"status": "spam", "filter": {"all_messages": True}}
+    response, statuses = bulk_update(db, http, run, documents, body)
+    assert response.json()["modified_count"] == 2
+    assert statuses == ["spam", "spam"]
+
+
+def test_single_update_is_a_404_only_for_missing_messages(api, db, http, run, message):
+    document = message(status="read")
+
+    async def scenario():
+        await db.contact_messages.insert_one(dict(document))
+        async with http() as client:
+            unchanged = await client.put(f"/api/contact/{document['id']}/status", params={"status": "read"})
+            missing = await client.put(f"/api/contact/{uuid.uuid4()}/status", params={"status": "read"})
+        return unchanged, missing
+
+    unchanged, missing = run(scenario())
+    assert unchanged.status_code == 200
+    assert missing.status_code == 404
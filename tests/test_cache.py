@@ -0,0 +1,76 @@
+import asyncio
+
+from cache import ReadCache
+
+
+def test_invalidation_during_load_is_not_cached(run):
+    cache = ReadCache()
+    values = iter(["before", "after"])
+    release = asyncio.Event()
+
+    async def slow_loader():
+        await release.wait()
+        return next(values)
+
+    async def scenario():
+        load = asyncio.create_task(cache.get_or_load("key", slow_loader))
+        await asyncio.sleep(0)
+        # A write lands while the read is in flight
+        cache.invalidate("key")
+        release.set()
+        first = await load
+        second = await cache.get_or_load("key", slow_loader)
+        return first, second
+
+    assert run(scenario()) == ("before", "after")
+
+
+def test_invalidate_where_bumps_the_epoch_for_unrelated_loads(run):
+    cache = ReadCache()
+    release = asyncio.Event()
+
+    async def loader():
+        await release.wait()
+        return "listing"
+
+    async def scenario():
+        load = asyncio.create_task(cache.get_or_load(("messages", 1), loader))
+        await asyncio.sleep(0)
+        cache.invalidate_where(lambda key: key[0] == "messages")
+        release.set()
+        await load
+        return cache.stats()["entries"]
+
+    assert run(scenario()) == 0
+
+
+def test_concurrent_misses_share_one_load(run):
+    cache = ReadCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return "value"
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+
+    assert run(scenario()) == ["value"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+    assert run(cache.get_or_load("key", loader)) == "value"
+    assert cache.hits == 1
+
+
+def test_disabled_cache_always_loads(run):
+    cache = ReadCache(ttl=0)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return "value"
+
+    run(cache.get_or_load("key", loader))
+    run(cache.get_or_load("key", loader))
+    assert len(calls) == 2
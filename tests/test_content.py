@@ -0,0 +1,83 @@
+import asyncio
+import gzip
+import json
+import os
+
+import pytest
+
+import content
+from content import PortfolioContent
+
+DOCUMENT = {"personal": {"name": "Sender"}, "projects": [{"title": "Portfolio"}]}
+
+
+@pytest.fixture
+def portfolio(api, tmp_path, monkeypatch):
+    # Without brotli installed the choice is the same everywhere
+    monkeypatch.setattr(content, "brotli", None)
+    path = tmp_path / "portfolio_content.json"
+    path.write_text(json.dumps(DOCUMENT), encoding="utf-8")
+    portfolio = PortfolioContent(path=path, reload_interval=0)
+    portfolio.load()
+    monkeypatch.setattr(api, "portfolio_content", portfolio)
+    return portfolio
+
+
+def get(http, run, url, **headers):
+    async def scenario():
+        async with http() as client:
+            return await client.get(url, headers=headers)
+
+    return run(scenario())
+
+
+def test_matching_etag_is_a_304(portfolio, http, run):
+    first = get(http, run, "/api/portfolio/projects", **{"Accept-Encoding": "identity"})
+    assert first.status_code == 200
+    assert first.json() == DOCUMENT["projects"]
+    assert first.headers["Vary"] == "Accept-Encoding"
+
+    etag = first.headers["ETag"]
+    again = get(http, run, "/api/portfolio/projects", **{"Accept-Encoding": "identity", "If-None-Match": f"W/{etag}"})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.content == b""
+
+    stale = get(http, run, "/api/portfolio/projects", **{"Accept-Encoding": "identity", "If-None-Match": '"other"'})
+    assert stale.status_code == 200
+
+
+def test_encoding_follows_accept_encoding(portfolio):
+    body = portfolio._bodies[None]
+    assert body.choose("gzip, deflate") == "gzip"
+    assert body.choose("*") == "gzip"
+    assert body.choose("gzip;q=0, deflate") == "identity"
+    assert body.choose("") == "identity"
+    assert json.loads(gzip.decompress(body.variants["gzip"].body)) == DOCUMENT
+    # Each encoding is its own representation
+    assert body.variants["gzip"].etag != body.variants["identity"].etag
+
+
+def test_unknown_section_is_a_404(portfolio, http, run):
+    assert get(http, run, "/api/portfolio/missing").status_code == 404
+    assert get(http, run, "/api/portfolio").json() == DOCUMENT
+
+
+def test_changed_file_is_reloaded(tmp_path, run):
+    path = tmp_path / "portfolio_content.json"
+    path.write_text(json.dumps(DOCUMENT), encoding="utf-8")
+    portfolio = PortfolioContent(path=path, reload_interval=0.01)
+
+    async def scenario():
+        portfolio.start()
+        before = portfolio._bodies["projects"].variants["identity"].etag
+        path.write_text(json.dumps({**DOCUMENT, "projects": []}), encoding="utf-8")
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        await asyncio.sleep(0.1)
+        await portfolio.stop()
+        return before, portfolio._bodies["projects"]
+
+    before, projects = run(scenario())
+    assert projects.variants["identity"].body == b"[]"
+    assert projects.variants["identity"].etag != before
@@ -0,0 +1,71 @@
+import asyncio
+
+from events import SOURCE_CHANGE_STREAM, EventBroker, parse_event_id
+
+
+async def replayed(broker, last_event_id, count):
+    """
+    The first `count` frames after the retry hint
+    """
+    stream = broker.stream(parse_event_id(last_event_id))
+    await stream.__anext__()
+    frames = [await stream.__anext__() for _ in range(count)]
+    await stream.aclose()
+    return frames
+
+
+def event_ids(frames):
+    return [line[4:].decode() for frame in frames for line in frame.split(b"\n") if line.startswith(b"id: ")]
+
+
+def test_local_ids_from_another_process_get_a_reset(run):
+    worker, other = EventBroker(heartbeat=0.01), EventBroker(heartbeat=0.01)
+    for index in range(3):
+        worker.publish("message.status", {"id": str(index)})
+        other.publish("message.status", {"id": str(index)})
+    first_other = f"{other.epoch}-1"
+
+    frames = run(replayed(worker, first_other, 2))
+    assert frames[0].startswith(b"event: reset")
+    assert frames[1] == b": keep-alive\n\n"
+
+    frames = run(replayed(worker, f"{worker.epoch}-1", 2))
+    assert event_ids(frames) == [f"{worker.epoch}-2", f"{worker.epoch}-3"]
+
+
+def test_change_stream_ids_resume_on_any_worker(run):
+    workers = [EventBroker(source=SOURCE_CHANGE_STREAM, heartbeat=0.01) for _ in range(2)]
+    for worker in workers:
+        worker.publish("message.created", {"id": "a"}, cluster_time=(100, 1))
+        worker.publish("message.status", {"id": "a"}, cluster_time=(100, 1))
+        worker.publish("message.status", {"id": "b"}, cluster_time=(101, 4))
+    seen = [event.id for event in workers[0]._replay]
+    assert seen == ["cluster-100.1.0", "cluster-100.1.1", "cluster-101.4.0"]
+
+    frames = run(replayed(workers[1], seen[0], 2))
+    assert event_ids(frames) == seen[1:]
+
+    # Older than anything this worker still holds
+    frames = run(replayed(workers[1], "cluster-99.1.0", 1))
+    assert frames[0].startswith(b"event: reset")
+
+
+def test_stop_ends_open_streams(run):
+    broker = EventBroker(heartbeat=60)
+
+    async def scenario():
+        broker.start(None)
+        stream = broker.stream()
+        await stream.__anext__()
+        waiting = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.01)
+        await broker.stop()
+        ended = await asyncio.wait_for(asyncio.gather(waiting, return_exceptions=True), 1)
+        # Streams opened during shutdown end right away
+        late = [frame async for frame in broker.stream()]
+        return ended[0], late, broker.subscriber_count
+
+    ended, late, subscribers = run(scenario())
+    assert isinstance(ended, StopAsyncIteration)
+    assert late == []
+    assert subscribers == 0
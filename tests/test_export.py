@@ -0,0 +1,36 @@
+import csv
+import io
+from datetime import datetime
+
+from export import export_csv
+
+
+async def rows(documents):
+    for document in documents:
+        yield document
+
+
+def test_csv_cells_that_spreadsheets_evaluate_are_quoted(run):
+    document = {
+        "id": "1",
+        "name": "=HYPERLINK(\"http://example.com\")",
+        "email": "+cmd@example.com",
+        "subject": "@SUM(A1)",
+        "message": "-1 and more",
+        "timestamp": datetime(2024, 1, 1),
+        "status": "new",
+    }
+
+    async def scenario():
+        return b"".join([chunk async for chunk in export_csv(rows([document]), 10)]).decode()
+
+    exported = list(csv.DictReader(io.StringIO(run(scenario()))))
+    assert exported == [{
+        "id": "1",
+        "name": "'=HYPERLINK(\"http://example.com\")",
+        "email": "'+cmd@example.com",
+        "subject": "'@SUM(A1)",
+        "message": "'-1 and more",
+        "timestamp": "2024-01-01T00:00:00",
+        "status": "new",
+    }]
@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from idempotency import IDEMPOTENCY_COLLECTION, STATE_PENDING, IdempotencyError, IdempotencyStore
+
+
+class Operation:
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("insert failed")
+        return {"success": True, "id": str(self.calls)}
+
+
+def test_same_key_requests_share_one_operation(db, run):
+    store = IdempotencyStore()
+    operation = Operation()
+
+    async def scenario():
+        requests = [asyncio.create_task(store.execute(db, "key", "hash", operation)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        operation.release.set()
+        responses = await asyncio.gather(*requests)
+        # Served from the stored response by another process's store
+        replay = await IdempotencyStore().execute(db, "key", "hash", operation)
+        return responses, replay
+
+    responses, replay = run(scenario())
+    assert operation.calls == 1
+    assert responses == [{"success": True, "id": "1"}] * 3
+    assert replay == responses[0]
+
+
+def test_key_reused_with_a_different_body_is_rejected(db, run):
+    store = IdempotencyStore()
+    operation = Operation()
+    operation.release.set()
+
+    async def scenario():
+        await store.execute(db, "key", "hash", operation)
+        for other in (store, IdempotencyStore()):
+            with pytest.raises(IdempotencyError) as error:
+                await other.execute(db, "key", "other hash", operation)
+            assert error.value.status_code == 422
+
+    run(scenario())
+    assert operation.calls == 1
+
+
+def test_failed_operation_releases_the_key(db, run):
+    store = IdempotencyStore()
+    failing = Operation(fail=True)
+    failing.release.set()
+    succeeding = Operation()
+    succeeding.release.set()
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await store.execute(db, "key", "hash", failing)
+        assert await db[IDEMPOTENCY_COLLECTION].count_documents({}) == 0
+        return await store.execute(db, "key", "hash", succeeding)
+
+    assert run(scenario()) == {"success": True, "id": "1"}
+
+
+def test_expired_claim_is_taken_over(db, run):
+    store = IdempotencyStore(wait_timeout=1, poll_interval=0.01)
+    operation = Operation()
+    operation.release.set()
+    created = datetime.utcnow() - timedelta(minutes=5)
+
+    async def scenario():
+        # Left by a worker that crashed mid-operation
+        await db[IDEMPOTENCY_COLLECTION].insert_one({
+            "_id": "key",
+            "request_hash": "hash",
+            "state": STATE_PENDING,
+            "lease": "crashed",
+            "pending_until": created + store.lease,
+            "created_at": created,
+        })
+        response = await store.execute(db, "key", "hash", operation)
+        return response, await db[IDEMPOTENCY_COLLECTION].find_one({"_id": "key"})
+
+    response, record = run(scenario())
+    assert response == {"success": True, "id": "1"}
+    assert record["state"] == "done"
+
+
+def test_live_claim_is_waited_on(db, run):
+    store = IdempotencyStore(wait_timeout=0.05, poll_interval=0.01)
+    operation = Operation()
+
+    async def scenario():
+        await db[IDEMPOTENCY_COLLECTION].insert_one({
+            "_id": "key",
+            "request_hash": "hash",
+            "state": STATE_PENDING,
+            "lease": "other",
+            "pending_until": datetime.utcnow() + timedelta(minutes=1),
+            "created_at": datetime.utcnow(),
+        })
+        with pytest.raises(IdempotencyError) as error:
+            await store.execute(db, "key", "hash", operation)
+        return error.value.status_code
+
+    assert run(scenario()) == 409
+    assert operation.calls == 0
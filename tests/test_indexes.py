@@ -0,0 +1,34 @@
+from pymongo import ASCENDING, DESCENDING
+
+from indexes import check_indexes, ensure_collection_indexes, ensure_indexes
+
+
+async def index_names(collection):
+    return {index["name"] async for index in collection.list_indexes()}
+
+
+def test_report_lists_missing_and_unregistered_indexes(db, run):
+    async def scenario():
+        await ensure_indexes(db)
+        await db.contact_messages.drop_index("status_timestamp")
+        await db.contact_messages.create_index("email", name="email_1")
+        return await check_indexes(db)
+
+    report = run(scenario())["contact_messages"]
+    assert report["missing"] == ["status_timestamp"]
+    assert report["unregistered"] == ["email_1"]
+    # The embedded engine has no $indexStats
+    assert report["unused"] == []
+
+
+def test_index_on_the_same_keys_is_replaced(db, run):
+    async def scenario():
+        await db.contact_messages.create_index([("status", ASCENDING), ("timestamp", DESCENDING)])
+        await db.contact_messages.create_index("email", name="email_1")
+        await ensure_collection_indexes(db, "contact_messages")
+        return await index_names(db.contact_messages)
+
+    names = run(scenario())
+    assert "status_1_timestamp_-1" not in names
+    # Indexes on other keys are reported by check_indexes, not dropped
+    assert {"status_timestamp", "email_1"} <= names
@@ -0,0 +1,53 @@
+from metrics import Counter, Histogram, Registry, registry
+
+
+def sample(text, series):
+    """
+    The value of one rendered series, 0 if it is not there yet
+    """
+    for line in text.splitlines():
+        name, _, value = line.rpartition(" ")
+        if name == series:
+            return float(value)
+    return 0
+
+
+def test_routes_are_labelled_by_their_template(http, run):
+    route = 'http_request_duration_seconds_count{method="GET",route="/api/contact/{message_id}"}'
+    unmatched = 'http_request_duration_seconds_count{method="GET",route="unmatched"}'
+
+    async def scenario():
+        before = registry.render()
+        async with http() as client:
+            for message_id in ("msg-alpha", "msg-beta"):
+                await client.get(f"/api/contact/{message_id}")
+            await client.get("/not/a/route")
+        return before, registry.render()
+
+    before, after = run(scenario())
+    assert sample(after, route) - sample(before, route) == 2
+    assert sample(after, unmatched) - sample(before, unmatched) == 1
+    assert "msg-alpha" not in after and "msg-beta" not in after
+
+
+def test_prometheus_text_format():
+    metrics = Registry()
+    requests = metrics.register(Counter("requests_total", "Requests", ("path",)))
+    latency = metrics.register(Histogram("latency_seconds", "Latency", ("path",), buckets=(0.1, 1.0)))
+    requests.inc('a"b\\c\n')
+    latency.observe(0.05, "/")
+    latency.observe(0.5, "/")
+    latency.observe(5, "/")
+
+    assert metrics.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{path="a\\"b\\\\c\\n"} 1',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{path="/",le="0.1"} 1',
+        'latency_seconds_bucket{path="/",le="1.0"} 2',
+        'latency_seconds_bucket{path="/",le="+Inf"} 3',
+        'latency_seconds_sum{path="/"} 5.55',
+        'latency_seconds_count{path="/"} 3',
+    ]
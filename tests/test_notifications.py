@@ -0,0 +1,99 @@
+from datetime import datetime
+
+import server
+from notifications import DEAD_LETTER_COLLECTION, OUTBOX_COLLECTION, EmailChannel, NotificationDispatcher
+
+
+class RecordingChannel:
+    name = "webhook"
+
+    def __init__(self, error=None):
+        self.sent = []
+        self.error = error
+
+    async def send(self, messages):
+        if self.error is not None:
+            raise self.error
+        self.sent.append(messages)
+
+    async def close(self):
+        pass
+
+
+def test_notification_is_queued_when_bookkeeping_fails(db, run, message, monkeypatch):
+    async def failing(db, documents):
+        raise RuntimeError("stats unavailable")
+
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "notifier", NotificationDispatcher(channels=[RecordingChannel()]))
+    monkeypatch.setattr(server, "record_inserts", failing)
+    monkeypatch.setattr(server.rollups, "record_inserts", failing)
+
+    run(server.after_insert([message()]))
+    assert run(db[OUTBOX_COLLECTION].count_documents({})) == 1
+
+
+def test_subject_line_breaks_are_folded(message):
+    channel = EmailChannel("localhost", 25, "portfolio@localhost", ["owner@example.com"])
+    email = channel.compose([message(subject="Hello\r\nBcc: victim@example.com")])
+    assert email["Subject"] == "New contact message: Hello Bcc: victim@example.com"
+    assert email["Bcc"] is None
+
+
+def test_compose_errors_are_dead_lettered_without_retries(db, run, message):
+    channel = EmailChannel("localhost", 25, "portfolio@localhost", ["owner@example.com"])
+    dispatcher = NotificationDispatcher(channels=[channel])
+
+    async def scenario():
+        await dispatcher.enqueue(db, [{**message(), "email": "bad\naddress@example.com"}])
+        await dispatcher.deliver_due(db, "email")
+        return (
+            await db[OUTBOX_COLLECTION].count_documents({}),
+            await db[DEAD_LETTER_COLLECTION].find_one({}),
+        )
+
+    pending, dead = run(scenario())
+    assert pending == 0
+    assert dead["attempts"] == 1
+
+
+def test_failed_delivery_backs_off_then_dead_letters(db, run, message):
+    channel = RecordingChannel(error=RuntimeError("webhook down"))
+    dispatcher = NotificationDispatcher(channels=[channel], max_attempts=2, backoff_base=60)
+
+    async def scenario():
+        await dispatcher.enqueue(db, [message()])
+        await dispatcher.deliver_due(db, "webhook")
+        retry = await db[OUTBOX_COLLECTION].find_one({})
+        # Not due again until the backoff has passed
+        assert await dispatcher.deliver_due(db, "webhook") == 0
+        await db[OUTBOX_COLLECTION].update_one({}, {"$set": {"available_at": datetime.utcnow()}})
+        await dispatcher.deliver_due(db, "webhook")
+        return retry, await db[OUTBOX_COLLECTION].count_documents({}), await db[DEAD_LETTER_COLLECTION].find_one({})
+
+    retry, pending, dead = run(scenario())
+    assert retry["attempts"] == 1
+    assert retry["last_error"] == "webhook down"
+    assert (retry["available_at"] - datetime.utcnow()).total_seconds() > 40
+    assert pending == 0
+    assert dead["attempts"] == 2
+    assert run(dispatcher.retry_dead_letters(db)) == 1
+
+
+def test_claim_lease_hides_entries_until_it_expires(db, run, message):
+    channel = RecordingChannel()
+    dispatcher = NotificationDispatcher(channels=[channel], lease=60)
+
+    async def scenario():
+        await dispatcher.enqueue(db, [message(), message()])
+        # A worker that claimed both and died before sending
+        claimed = await dispatcher._claim(db, "webhook")
+        assert await dispatcher.deliver_due(db, "webhook") == 0
+        await db[OUTBOX_COLLECTION].update_many({}, {"$set": {"available_at": datetime.utcnow()}})
+        return claimed, await dispatcher.deliver_due(db, "webhook")
+
+    claimed, redelivered = run(scenario())
+    assert len(claimed) == 2
+    assert redelivered == 2
+    # Both went out as one digest
+    assert [len(messages) for messages in channel.sent] == [2]
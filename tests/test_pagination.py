@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from pagination import build_message_query
+from repository import ContactMessageRepository
+from schema import encode_message
+
+START = datetime(2024, 1, 1)
+
+
+def list_all(http, run, limit, **params):
+    async def pages():
+        seen, cursor = [], None
+        async with http() as client:
+            while True:
+                page = {**params, "limit": limit, **({"cursor": cursor} if cursor else {})}
+                response = await client.get("/api/contact", params=page)
+                assert response.status_code == 200
+                seen.extend(message["id"] for message in response.json())
+                cursor = response.headers.get("X-Next-Cursor")
+                if cursor is None:
+                    return seen
+
+    return run(pages())
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+def test_pages_cover_timestamp_ties_once(api, db, http, run, limit, message):
+    # Several messages share each timestamp
+    documents = [message(timestamp=START + timedelta(minutes=index // 4)) for index in range(12)]
+    run(db.contact_messages.insert_many([dict(document) for document in documents]))
+
+    seen = list_all(http, run, limit)
+    assert sorted(seen) == sorted(document["id"] for document in documents)
+    assert len(seen) == len(set(seen))
+    timestamps = {document["id"]: document["timestamp"] for document in documents}
+    assert [timestamps[message_id] for message_id in seen] == sorted(timestamps.values(), reverse=True)
+
+
+def page_through(db, run, limit):
+    repository = ContactMessageRepository(db)
+
+    async def pages():
+        seen, cursor = [], None
+        while True:
+            messages, cursor = await repository.list(build_message_query(cursor=cursor), False, limit)
+            seen.extend(message["id"] for message in messages)
+            if cursor is None:
+                return seen
+
+    return run(pages())
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+def test_cursor_walks_mixed_legacy_and_compact_ids(db, run, limit, message):
+    # Half the messages in each layout, sharing timestamps
+    documents = [message(timestamp=START + timedelta(minutes=index // 4)) for index in range(12)]
+    legacy = [{**document, "_id": ObjectId()} for document in documents[::2]]
+    compact = [encode_message(dict(document)) for document in documents[1::2]]
+    run(db.contact_messages.insert_many(legacy + compact))
+
+    seen = page_through(db, run, limit)
+    assert sorted(seen) == sorted(document["id"] for document in documents)
+    assert len(seen) == len(set(seen))
+    timestamps = {document["id"]: document["timestamp"] for document in documents}
+    assert [timestamps[message_id] for message_id in seen] == sorted(timestamps.values(), reverse=True)
+
+
+def test_filters_apply_to_every_page(api, db, http, run, message):
+    documents = [message(timestamp=START + timedelta(days=index)) for index in range(6)]
+    for document in documents[::2]:
+        document["status"] = "read"
+    run(db.contact_messages.insert_many([dict(document) for document in documents]))
+
+    seen = list_all(http, run, 1, status="read", since=START.isoformat(), until=(START + timedelta(days=4)).isoformat())
+    assert seen == [documents[2]["id"], documents[0]["id"]]
+
+
+def test_invalid_cursor_is_a_400(api, http, run):
+    async def scenario():
+        async with http() as client:
+            return await client.get("/api/contact", params={"cursor": "not-a-cursor"})
+
+    assert run(scenario()).status_code == 400
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+from repository import ContactMessageRepository
+from retention import ARCHIVE_COLLECTION, HOT_COLLECTION, RetentionPolicy
+from schema import ids_query
+
+
+def days_ago(days):
+    return datetime.utcnow() - timedelta(days=days)
+
+
+class RacingPolicy(RetentionPolicy):
+    """
+    Changes a message's status right after the batch is copied, as an admin
+    request landing between the copy and the delete would
+    """
+
+    def __init__(self, message_id, new_status, **kwargs):
+        super().__init__(**kwargs)
+        self.message_id = message_id
+        self.new_status = new_status
+
+    async def _copy(self, db, documents):
+        await super()._copy(db, documents)
+        await db[HOT_COLLECTION].update_one({"_id": self.message_id}, {"$set": {"status": self.new_status}})
+
+
+def test_old_messages_move_to_the_archive(db, run, compact_message):
+    documents = [
+        compact_message(status="read", timestamp=days_ago(30)),
+        compact_message(status="new", timestamp=days_ago(30)),
+        compact_message(status="read", timestamp=days_ago(1)),
+    ]
+    archived = []
+
+    async def on_archived(moved):
+        archived.extend(moved)
+
+    async def scenario():
+        await db[HOT_COLLECTION].insert_many([dict(document) for document in documents])
+        policy = RetentionPolicy(max_age=timedelta(days=7), on_archived=on_archived)
+        report = await policy.run(db)
+        hot = [document["_id"] async for document in db[HOT_COLLECTION].find()]
+        cold = [document["_id"] async for document in db[ARCHIVE_COLLECTION].find()]
+        return report, hot, cold
+
+    report, hot, cold = run(scenario())
+    assert report["archived"] == 1
+    assert cold == [documents[0]["_id"]]
+    assert sorted(hot) == sorted([documents[1]["_id"], documents[2]["_id"]])
+    assert [document["_id"] for document in archived] == cold
+
+
+def test_status_changed_after_copy_stays_hot(db, run, compact_message):
+    racing = compact_message(status="read", timestamp=days_ago(30))
+    other = compact_message(status="read", timestamp=days_ago(30))
+
+    async def scenario():
+        await db[HOT_COLLECTION].insert_many([dict(racing), dict(other)])
+        # "spam" still matches the policy, but the copy says "read"
+        policy = RacingPolicy(racing["_id"], "spam", max_age=timedelta(days=7))
+        report = await policy.run(db, max_batches=1)
+        hot = await db[HOT_COLLECTION].find().to_list(None)
+        cold = await db[ARCHIVE_COLLECTION].find().to_list(None)
+        return report, hot, cold
+
+    report, hot, cold = run(scenario())
+    assert report["archived"] == 1
+    assert [(document["_id"], document["status"]) for document in hot] == [(racing["_id"], "spam")]
+    assert [document["_id"] for document in cold] == [other["_id"]]
+
+
+def test_interrupted_copy_is_replaced_with_current_version(db, run, compact_message):
+    original = compact_message(status="spam", timestamp=days_ago(30))
+
+    async def scenario():
+        await db[HOT_COLLECTION].insert_one(dict(original))
+        await db[ARCHIVE_COLLECTION].insert_one({**original, "status": "read"})
+        await RetentionPolicy(max_age=timedelta(days=7)).run(db)
+        return (
+            await db[HOT_COLLECTION].count_documents({}),
+            await db[ARCHIVE_COLLECTION].find().to_list(None),
+        )
+
+    hot_count, cold = run(scenario())
+    assert hot_count == 0
+    assert [document["status"] for document in cold] == ["spam"]
+
+
+def test_batch_read_by_two_runs_is_counted_once(db, run, compact_message):
+    documents = [compact_message(status="read", timestamp=days_ago(30)) for _ in range(3)]
+    archived = []
+
+    async def on_archived(moved):
+        archived.extend(moved)
+
+    async def scenario():
+        await db[HOT_COLLECTION].insert_many([dict(document) for document in documents])
+        policy = RetentionPolicy(max_age=timedelta(days=7), on_archived=on_archived)
+        # Both runs read the batch before either deleted it
+        batch = await db[HOT_COLLECTION].find(policy.selector()).to_list(None)
+        counts = [await policy._move(db, batch), await policy._move(db, batch)]
+        return counts, await db[ARCHIVE_COLLECTION].count_documents({})
+
+    counts, cold = run(scenario())
+    assert counts == [3, 0]
+    assert cold == 3
+    assert len(archived) == 3
+
+
+def test_bulk_status_reaches_archived_messages(db, run, compact_message):
+    hot = compact_message(status="new", timestamp=days_ago(30))
+    cold = compact_message(status="read", timestamp=days_ago(30))
+
+    async def scenario():
+        await db[HOT_COLLECTION].insert_one(dict(hot))
+        await db[ARCHIVE_COLLECTION].insert_one(dict(cold))
+        repository = ContactMessageRepository(db)
+        ids = [str(document["_id"].as_uuid()) for document in (hot, cold)]
+        snapshot = await repository.status_snapshot(ids)
+        modified = await repository.set_status_many(ids_query(ids), "spam")
+        return ids, snapshot, modified, await repository.get(ids[1])
+
+    ids, snapshot, modified, archived = run(scenario())
+    assert {message_id: document["status"] for message_id, document in snapshot.items()} == {
+        ids[0]: "new", ids[1]: "read"
+    }
+    assert modified == 2
+    assert archived["status"] == "spam"
@@ -0,0 +1,83 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+import rollups
+from rollups import ROLLUP_COLLECTION, rebuild_rollups, record_inserts, record_status_moves, timeseries
+
+START = datetime(2024, 1, 1)
+END = datetime(2024, 1, 2)
+
+
+@pytest.fixture(autouse=True)
+def quick_cutoff(monkeypatch):
+    monkeypatch.setattr(rollups, "GENERATION_REFRESH", 0.01)
+
+
+async def store(db, document):
+    await db.contact_messages.insert_one(dict(document))
+    await record_inserts(db, [document])
+
+
+def test_increments_before_the_first_build_are_no_ops(db, run, compact_message):
+    async def scenario():
+        await store(db, compact_message())
+        assert await db[ROLLUP_COLLECTION].count_documents({}) == 0
+        await rebuild_rollups(db)
+        await store(db, compact_message(timestamp=START.replace(hour=1)))
+        return await timeseries(db, "hour", START, START.replace(hour=2))
+
+    result = run(scenario())
+    assert result["source"] == "rollups"
+    assert [point["total"] for point in result["series"]] == [1, 1]
+
+
+def test_writes_during_a_rebuild_are_counted_once(db, run, compact_message, monkeypatch):
+    hourly_counts = rollups._hourly_counts
+    recent = []
+
+    async def write_around_count(db, match=None):
+        # Past the cutoff, so increments reach the new generation; the count
+        # sees this one but must leave it out
+        early = compact_message(timestamp=datetime.utcnow())
+        await store(db, early)
+        counts = await hourly_counts(db, match)
+        late = compact_message(timestamp=datetime.utcnow())
+        await store(db, late)
+        await db.contact_messages.update_one({"_id": late["_id"]}, {"$set": {"status": "read"}})
+        await record_status_moves(db, [(late["timestamp"], "new", 1)], "read")
+        recent.extend([early, late])
+        return counts
+
+    async def scenario():
+        documents = [compact_message(), compact_message(timestamp=START.replace(hour=1))]
+        await db.contact_messages.insert_many(documents)
+        first = await rebuild_rollups(db)
+        monkeypatch.setattr(rollups, "_hourly_counts", write_around_count)
+        second = await rebuild_rollups(db)
+        monkeypatch.setattr(rollups, "_hourly_counts", hourly_counts)
+        older = await timeseries(db, "day", START, END, by_status=True)
+        newer = await timeseries(
+            db, "hour", recent[0]["timestamp"], recent[-1]["timestamp"] + timedelta(hours=1), by_status=True
+        )
+        generations = await db[ROLLUP_COLLECTION].distinct("generation")
+        return first, second, older, newer, generations
+
+    first, second, older, newer, generations = run(scenario())
+    assert second["generation"] == first["generation"] + 1
+    assert older["series"] == [{"start": START, "total": 2, "statuses": {"new": 2}}]
+    assert sum(point["total"] for point in newer["series"]) == 2
+    statuses = [point["statuses"] for point in newer["series"] if point["total"]]
+    assert sum(map(Counter, statuses), Counter()) == {"new": 1, "read": 1}
+    assert generations == [second["generation"]]
+
+
+def test_concurrent_rebuild_is_refused(db, run):
+    async def scenario():
+        await db[ROLLUP_COLLECTION].insert_one(
+            {"_id": rollups.META_ID, "building": 1, "building_since": datetime.utcnow()}
+        )
+        return await rebuild_rollups(db)
+
+    assert run(scenario())["in_progress"] is True
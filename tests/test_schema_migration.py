@@ -0,0 +1,141 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from bson import Binary, ObjectId
+from pymongo.errors import BulkWriteError
+
+from indexes import ensure_indexes
+from repository import ContactMessageRepository
+from retention import only_duplicate_ids
+from schema import LEGACY_ID, MIGRATED, _convert_batch, decode_message, migrate
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def legacy_message(message):
+    """
+    Factory for messages as older versions stored them, with the UUID as an
+    `id` string next to an ObjectId _id
+    """
+    def make(index, status="new"):
+        return {"_id": ObjectId(), **message(timestamp=START + timedelta(hours=index), status=status)}
+
+    return make
+
+
+async def legacy_database(db, documents):
+    # Older versions made `id` unique without sparse
+    await db.contact_messages.create_index(LEGACY_ID, unique=True, name="id_unique")
+    await db.contact_messages.insert_many(documents)
+
+
+async def index_names(collection):
+    return {index["name"] async for index in collection.list_indexes()}
+
+
+def test_migration_replaces_legacy_id_unique_index(db, run, legacy_message):
+    documents = [legacy_message(index) for index in range(5)]
+
+    async def scenario():
+        await legacy_database(db, documents)
+        report = await migrate(db, batch_size=2)
+        stored = await db.contact_messages.find().to_list(None)
+        return report, stored, await index_names(db.contact_messages)
+
+    report, stored, names = run(scenario())
+    assert report["contact_messages"]["converted"] == 5
+    assert report["contact_messages"]["remaining"] == 0
+    assert "id_unique" not in names and "legacy_id" in names
+    assert all(isinstance(document["_id"], Binary) for document in stored)
+    # Tagged for the change stream feed, but not part of the message
+    assert all(document[MIGRATED] for document in stored)
+    assert MIGRATED not in decode_message(dict(stored[0]))
+    assert sorted(str(document["_id"].as_uuid()) for document in stored) == sorted(
+        document[LEGACY_ID] for document in documents
+    )
+
+
+def test_startup_indexes_let_compact_writes_through(db, run, legacy_message):
+    async def scenario():
+        await legacy_database(db, [legacy_message(0)])
+        await ensure_indexes(db)
+        repository = ContactMessageRepository(db)
+        for index in range(2):
+            message = legacy_message(index)
+            del message["_id"]
+            await repository.insert(message)
+        return await db.contact_messages.count_documents({}), await index_names(db.contact_messages_archive)
+
+    count, archive_names = run(scenario())
+    assert count == 3
+    # A collection failing does not stop the rest of the registry
+    assert "timestamp_id_desc" in archive_names
+
+
+def test_originals_kept_when_copies_are_rejected(db, run, legacy_message):
+    documents = [legacy_message(index) for index in range(3)]
+
+    async def scenario():
+        # Without the index replacement the legacy index takes one copy
+        # without an `id` and rejects the rest
+        await legacy_database(db, documents)
+        batch = await db.contact_messages.find().sort("_id", 1).to_list(None)
+        with pytest.raises(BulkWriteError):
+            await _convert_batch(db.contact_messages, batch)
+        return [document async for document in db.contact_messages.find({LEGACY_ID: {"$exists": True}})]
+
+    remaining = run(scenario())
+    assert [document[LEGACY_ID] for document in remaining] == [document[LEGACY_ID] for document in documents[1:]]
+
+
+def test_unnamed_duplicate_key_errors_are_told_apart(db, run):
+    # mongomock without the mongomock-motor key pattern patch names no index
+    bare = "E11000 Duplicate Key Error"
+    existing, missing = ObjectId(), ObjectId()
+    errors = [{"index": 0, "code": 11000, "errmsg": bare}, {"index": 1, "code": 11000, "errmsg": bare}]
+
+    async def scenario():
+        await db.contact_messages.insert_one({"_id": existing})
+        return (
+            await only_duplicate_ids(db.contact_messages, errors, [existing, existing]),
+            await only_duplicate_ids(db.contact_messages, errors, [existing, missing]),
+        )
+
+    assert run(scenario()) == (True, False)
+
+
+def test_interrupted_copy_is_replaced_with_current_version(db, run, legacy_message):
+    original = legacy_message(0, status="read")
+    stale_copy = {key: value for key, value in original.items() if key not in ("_id", LEGACY_ID)}
+    stale_copy.update({"_id": Binary.from_uuid(uuid.UUID(original[LEGACY_ID])), "status": "new"})
+
+    async def scenario():
+        await db.contact_messages.insert_many([original, stale_copy])
+        await migrate(db)
+        return await db.contact_messages.find().to_list(None)
+
+    stored = run(scenario())
+    assert len(stored) == 1
+    assert stored[0]["status"] == "read"
+
+
+def test_unknown_statuses_are_skipped(db, run, legacy_message):
+    documents = [legacy_message(0, "responded"), legacy_message(1, "pending"), legacy_message(2)]
+
+    async def scenario():
+        await db.contact_messages.insert_many([dict(document) for document in documents])
+        report = await migrate(db)
+        legacy = {
+            document[LEGACY_ID]: document["status"]
+            async for document in db.contact_messages.find({LEGACY_ID: {"$exists": True}})
+        }
+        return report, legacy
+
+    report, legacy = run(scenario())
+    assert report["contact_messages"]["converted"] == 1
+    assert report["contact_messages"]["skipped"] == 2
+    # Left unconverted with the status they were stored with
+    assert legacy == {documents[0][LEGACY_ID]: "responded", documents[1][LEGACY_ID]: "pending"}
+    assert decode_message(dict(documents[0]))["status"] == "responded"
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def documents(message):
+    return {
+        "subject": message(subject="Kubernetes", message="A question about deployments", timestamp=START),
+        "older": message(message="Kubernetes and more", timestamp=START.replace(hour=1), status="read"),
+        "newer": message(message="Kubernetes and more", timestamp=START.replace(hour=2)),
+        "unrelated": message(message="Nothing to see", timestamp=START.replace(hour=3)),
+    }
+
+
+@pytest.fixture
+def stored(api, run, documents):
+    async def insert():
+        for document in documents.values():
+            await api.messages_repo.insert(dict(document))
+
+    run(insert())
+    return api.messages_repo
+
+
+def search(http, run, documents, **params):
+    async def scenario():
+        async with http() as client:
+            return await client.get("/api/contact/search", params=params)
+
+    response = run(scenario())
+    assert response.status_code == 200
+    names = {document["id"]: name for name, document in documents.items()}
+    return [names[result["id"]] for result in response.json()]
+
+
+def test_subject_matches_rank_first_then_recency(stored, documents, http, run):
+    # Case and punctuation in the query do not matter
+    assert search(http, run, documents, q="KUBERNETES!") == ["subject", "newer", "older"]
+
+
+def test_status_filter_and_paging(stored, documents, http, run):
+    assert search(http, run, documents, q="kubernetes", status="read") == ["older"]
+    assert search(http, run, documents, q="kubernetes", limit=1, offset=1) == ["newer"]
+
+
+def test_scores_follow_the_text_index_weights(stored, documents, run):
+    async def scenario():
+        return await stored.search("kubernetes", None, 10, 0), await stored.search("  ", None, 10, 0)
+
+    results, empty = run(scenario())
+    scores = {result["id"]: result["score"] for result in results}
+    assert scores[documents["subject"]["id"]] == 5
+    assert scores[documents["newer"]["id"]] == scores[documents["older"]["id"]] == 1 / 3
+    assert empty == []
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+import serve
+
+
+def test_worker_default_follows_the_cgroup_quota(monkeypatch):
+    monkeypatch.setattr(serve.os, "sched_getaffinity", lambda pid: set(range(64)), raising=False)
+    monkeypatch.setattr(serve, "_cgroup_cpu_quota", lambda: 1.5)
+    assert serve.available_cpus() == 2
+
+    monkeypatch.setattr(serve, "_cgroup_cpu_quota", lambda: None)
+    assert serve.available_cpus() == 64
+
+
+def test_pool_budget_is_split_across_workers():
+    assert serve.pool_size_per_worker(100, 4) == 25
+    assert serve.pool_size_per_worker(10, 64) == 1
+
+
+def test_api_imports_without_storage_settings():
+    # Storage is configured in the startup hook, not when workers import the app
+    environment = {key: value for key, value in os.environ.items() if key not in ("MONGO_URL", "STORAGE_ENGINE")}
+    code = "import dotenv; dotenv.load_dotenv = lambda *args, **kwargs: None; import server"
+    subprocess.run([sys.executable, "-c", code], cwd=serve.ROOT_DIR, env=environment, check=True)
@@ -0,0 +1,94 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from slowops import SlowOpTracer, plan_summary, query_shape, read_records, summarize
+
+
+def record(duration_ms, shape, plan=None, route=None, collection="contact_messages"):
+    return {
+        "command": "find",
+        "collection": collection,
+        "duration_ms": duration_ms,
+        "shape": shape,
+        "plan": plan,
+        "method": "GET" if route else None,
+        "route": route,
+    }
+
+
+def test_query_shape_hides_every_literal():
+    command = {
+        "find": "contact_messages",
+        "filter": {"email": "sender@example.com", "status": {"$in": ["new", "read"]}},
+        "sort": {"timestamp": -1},
+        "limit": 50,
+        "pipeline": [],
+    }
+    assert query_shape(command) == {
+        "find": "?",
+        "filter": {"email": "?", "status": {"$in": ["?"]}},
+        "sort": {"timestamp": "?"},
+        "limit": "?",
+        "pipeline": [],
+    }
+
+
+def test_plan_summary_ignores_rejected_plans():
+    explain = {
+        "queryPlanner": {
+            "winningPlan": {
+                "stage": "FETCH",
+                "inputStage": {"stage": "IXSCAN", "indexName": "status_timestamp"},
+            },
+            "rejectedPlans": [{"stage": "COLLSCAN"}],
+        },
+    }
+    assert plan_summary(explain) == {"stages": ["FETCH", "IXSCAN"], "indexes": ["status_timestamp"], "collscan": False}
+    assert plan_summary({"stages": [{"$cursor": {"stage": "COLLSCAN"}}]})["collscan"] is True
+
+
+def test_summary_groups_by_shape_worst_first():
+    by_status = {"find": "?", "filter": {"status": "?"}}
+    by_email = {"find": "?", "filter": {"email": "?"}}
+    records = [
+        record(150, by_status, plan={"stages": ["IXSCAN"], "indexes": ["status_timestamp"], "collscan": False}),
+        record(120, by_status, route="/api/contact"),
+        record(400, by_email, plan={"stages": ["COLLSCAN"], "indexes": [], "collscan": True}),
+        record(101, by_email, collection="contact_messages_archive"),
+    ]
+
+    summary = summarize(records, top=2)
+    assert [(group["shape"], group["collection"], group["count"]) for group in summary] == [
+        (by_email, "contact_messages", 1),
+        (by_status, "contact_messages", 2),
+    ]
+    assert summary[0]["collscan"] is True
+    assert summary[1]["total_ms"] == 270
+    assert summary[1]["p95_ms"] == summary[1]["max_ms"] == 150
+    assert summary[1]["routes"] == ["GET /api/contact"]
+    assert summary[1]["indexes"] == ["status_timestamp"]
+
+
+def test_rotated_backups_are_read_oldest_first(tmp_path):
+    path = tmp_path / "slow_ops.log"
+    for name in ("slow_ops.log.1", "slow_ops.log.2", "slow_ops.log.10", "slow_ops.log"):
+        (tmp_path / name).write_text(json.dumps({"file": name}) + "\n")
+
+    assert [record["file"] for record in read_records(path)] == [
+        "slow_ops.log.10", "slow_ops.log.2", "slow_ops.log.1", "slow_ops.log"
+    ]
+
+
+def test_explain_slot_is_released_when_the_loop_is_gone():
+    tracer = SlowOpTracer(threshold_ms=0, explain_sample_rate=1, max_concurrent_explains=1)
+    loop = asyncio.new_event_loop()
+    loop.close()
+    tracer._loop, tracer._client = loop, object()
+    started = SimpleNamespace(
+        command_name="find", command={"find": "contact_messages", "filter": {}}, connection_id=1, request_id=1
+    )
+    tracer.started(started)
+    tracer.succeeded(SimpleNamespace(**vars(started), duration_micros=1000, database_name="portfolio"))
+
+    assert tracer._explaining == 0
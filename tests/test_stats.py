@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import stats
+from stats import STATS_COLLECTION, STATS_ID, read_stats, reconcile_stats, record_inserts, record_status_change
+
+
+def test_counters_include_messages_stored_before_them(db, run, message):
+    existing = [message(), message(status="read"), message(timestamp=datetime(2024, 2, 1))]
+
+    async def scenario():
+        await db.contact_messages.insert_many([dict(document) for document in existing])
+        # Before the counters are built an increment must not create them
+        await record_inserts(db, [message(timestamp=datetime(2024, 3, 1))])
+        assert await db[STATS_COLLECTION].find_one({"_id": STATS_ID}) is None
+
+        built = await read_stats(db)
+        added = message(timestamp=datetime(2024, 3, 1))
+        await db.contact_messages.insert_one(dict(added))
+        await record_inserts(db, [added])
+        await record_status_change(db, "new", "replied")
+        return built, await read_stats(db)
+
+    built, stats = run(scenario())
+    assert built["total"] == 3
+    assert built["statuses"] == {"new": 2, "read": 1}
+    assert stats["total"] == 4
+    assert stats["months"] == {"2024-01": 2, "2024-02": 1, "2024-03": 1}
+    assert stats["statuses"] == {"new": 2, "read": 1, "replied": 1}
+
+
+def test_reconcile_keeps_increments_made_while_it_runs(db, run, message, monkeypatch):
+    compute = stats.compute_stats
+    writes = []
+
+    async def compute_then_write(db):
+        fresh = await compute(db)
+        if not writes:
+            # Lands after the aggregation read the messages
+            added = message(timestamp=datetime(2024, 2, 1))
+            writes.append(added)
+            await db.contact_messages.insert_one(dict(added))
+            await record_inserts(db, [added])
+        return fresh
+
+    async def scenario():
+        await db.contact_messages.insert_one(dict(message()))
+        await read_stats(db)
+        # Drift for the reconcile to correct
+        await db[STATS_COLLECTION].update_one({"_id": STATS_ID}, {"$inc": {"total": 5}})
+        monkeypatch.setattr(stats, "compute_stats", compute_then_write)
+        result = await reconcile_stats(db)
+        return result, await read_stats(db)
+
+    result, stored = run(scenario())
+    assert result["drift"] == {"total": -5}
+    assert stored["total"] == 2
+    assert stored["months"] == {"2024-01": 1, "2024-02": 1}
+
+
+def test_reconcile_retries_when_counters_move_during_the_count(db, run, message, monkeypatch):
+    compute = stats.compute_stats
+    calls = []
+
+    async def write_then_compute(db):
+        if not calls:
+            # Both the aggregation and the increment count this one
+            added = message(status="read", timestamp=datetime(2024, 2, 1))
+            await db.contact_messages.insert_one(dict(added))
+            await record_inserts(db, [added])
+        calls.append(1)
+        return await compute(db)
+
+    async def scenario():
+        await db.contact_messages.insert_one(dict(message()))
+        await read_stats(db)
+        monkeypatch.setattr(stats, "compute_stats", write_then_compute)
+        result = await reconcile_stats(db)
+        return result, await read_stats(db)
+
+    result, stored = run(scenario())
+    assert len(calls) == 2
+    assert result["drift"] == {}
+    assert stored["total"] == 2
+    assert stored["statuses"] == {"new": 1, "read": 1}